@@ -0,0 +1,108 @@
+"""
+Micro-benchmarks for the CPU-heavy tools, fully offline.
+
+- extract_text_by_page on the PDFs in data/
+- generate_wordcloud_from_pdf
+- fetch_market_data with yfinance replaced by a synthetic data source
+
+Outputs are written to a temporary directory, never to data/. Tools that
+run in the tool process pool (@process_tool) are measured inline through
+their __wrapped__ function, so the patches below apply and the numbers are
+the tool's own work rather than IPC and worker start-up.
+
+    python -m bench.micro --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+from typing import Any, Callable, Dict, List
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+os.environ.setdefault("TRACE_FILE", "")
+
+from coding import agenttools, tools  # noqa: E402
+
+
+def measure(name: str, func: Callable[[], Any], repeat: int, warmup: int = 1) -> Dict[str, Any]:
+    for _ in range(warmup):
+        func()
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "name": name,
+        "repeat": repeat,
+        "mean_ms": statistics.mean(timings),
+        "min_ms": timings[0],
+        "p95_ms": timings[min(len(timings) - 1, round(0.95 * (len(timings) - 1)))],
+    }
+
+
+def fake_download(ticker, start=None, end=None, interval="1mo", progress=False, **kwargs) -> pd.DataFrame:
+    """
+    Stand-in for yf.download: a deterministic monthly random walk shaped like
+    yfinance's (Price, Ticker) MultiIndex frame.
+    """
+    dates = pd.date_range(start or "2022-01-01", end or "2025-05-01", freq="MS")
+    # hash() of a str changes with every interpreter (PYTHONHASHSEED); crc32 does not.
+    rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.05, len(dates))))
+    columns = pd.MultiIndex.from_product([["Close", "High", "Low", "Open", "Volume"], [ticker]],
+                                         names=["Price", "Ticker"])
+    values = np.column_stack([close, close * 1.03, close * 0.97, close, rng.integers(1e6, 1e8, len(dates))])
+    return pd.DataFrame(values, index=pd.Index(dates, name="Date"), columns=columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    data_dir = tools.DATA_DIR
+    results = []
+    with tempfile.TemporaryDirectory() as out_dir, \
+            mock.patch.object(tools, "DATA_DIR", out_dir), \
+            mock.patch.object(tools.yf, "download", fake_download), \
+            mock.patch("builtins.print"):
+        for pdf in ("ukr_rus.pdf", "uk_conflict_timeline.pdf"):
+            doc = tools.load_pdf(os.path.join(data_dir, pdf))
+            results.append(measure(f"extract_text_by_page[{pdf}]",
+                                   lambda: tools.extract_text_by_page(doc), args.repeat))
+        # The word cloud reads data/ukr_rus.pdf, so only its image write is stubbed.
+        with mock.patch("wordcloud.WordCloud.to_file"):
+            try:
+                results.append(measure("generate_wordcloud_from_pdf",
+                                       agenttools.generate_wordcloud_from_pdf.__wrapped__, args.repeat))
+            except LookupError:  # NLTK punkt/stopwords not downloaded
+                results.append({"name": "generate_wordcloud_from_pdf", "skipped": "NLTK data missing"})
+        results.append(measure("fetch_market_data[stubbed]", tools.fetch_market_data, args.repeat))
+
+    width = max(len(r["name"]) for r in results)
+    print(f"{'benchmark':<{width}}  {'mean ms':>10}  {'min ms':>10}  {'p95 ms':>10}")
+    for r in results:
+        if "skipped" in r:
+            print(f"{r['name']:<{width}}  skipped: {r['skipped']}")
+            continue
+        print(f"{r['name']:<{width}}  {r['mean_ms']:>10.1f}  {r['min_ms']:>10.1f}  {r['p95_ms']:>10.1f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
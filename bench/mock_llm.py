@@ -0,0 +1,128 @@
+"""
+OpenAI-compatible chat-completions stub for offline benchmarks.
+
+Serves POST .../chat/completions for both providers (Gemini is reached
+through its OpenAI-compatible endpoint, see coding/llm.py). Each reply
+sleeps for a configurable latency and follows a script of steps, picked by
+how many assistant messages the conversation already has:
+
+    {"latency_ms": 300, "jitter_ms": 100, "steps": [
+        {"tool_call": {"name": "fetch_market_data", "arguments": {}}},
+        {"content": "Here is the data. ##ALL DONE##"}
+    ]}
+
+Run standalone with `python -m bench.mock_llm --port 8765`.
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# Ends with a done marker, so every pipeline stops after one reply (see coding.termination).
+DEFAULT_CONTENT = "This is a mock reply. ##ALL DONE## ALL_DONE"
+DEFAULT_SCRIPT = {"latency_ms": 200, "jitter_ms": 50, "steps": [{"content": DEFAULT_CONTENT}]}
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, script: Optional[Dict[str, Any]] = None, seed: int = 42):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.script = dict(DEFAULT_SCRIPT, **(script or {}))
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.requests = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self) -> "MockLLMServer":
+        threading.Thread(target=self.serve_forever, daemon=True, name="mock-llm").start()
+        return self
+
+    def latency(self) -> float:
+        with self.random_lock:
+            jitter = self.random.uniform(-1, 1) * self.script.get("jitter_ms", 0)
+        return max(0.0, self.script.get("latency_ms", 0) + jitter) / 1000
+
+    def reply(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        messages: List[Dict[str, Any]] = payload.get("messages", [])
+        steps = self.script["steps"]
+        step = steps[min(sum(1 for m in messages if m.get("role") == "assistant"), len(steps) - 1)]
+        message: Dict[str, Any] = {"role": "assistant", "content": step.get("content")}
+        finish_reason = "stop"
+        if "tool_call" in step and payload.get("tools"):
+            call = step["tool_call"]
+            message["tool_calls"] = [{
+                "id": f"call_{next(self.ids)}", "type": "function",
+                "function": {"name": call["name"], "arguments": json.dumps(call.get("arguments", {}))},
+            }]
+            finish_reason = "tool_calls"
+        elif message["content"] is None:
+            message["content"] = DEFAULT_CONTENT
+        prompt_tokens = len(json.dumps(messages)) // 4
+        completion_tokens = len(json.dumps(message)) // 4
+        return {
+            "id": f"chatcmpl-mock-{next(self.ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "mock"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real providers
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            payload = {}
+        if not self.path.endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        self.server.requests += 1
+        time.sleep(self.server.latency())
+        self._send(200, self.server.reply(payload))
+
+    def _send(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def load_script(path: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not path:
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--script", help="JSON script with latency_ms, jitter_ms and steps")
+    args = parser.parse_args()
+    server = MockLLMServer(args.port, load_script(args.script))
+    print(f"Mock LLM listening on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
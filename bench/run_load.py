@@ -0,0 +1,172 @@
+"""
+Headless load test of the Streamlit pages against the mock LLM server.
+
+Each simulated session is a Streamlit AppTest that opens a page and sends
+a few prompts. AppTest drives a global script runtime and is not
+thread-safe, so every session runs in its own worker process. Sessions are
+therefore concurrent against the mock server, but they do not share the
+process-wide router, scheduler and HTTP pools the way sessions on one
+Streamlit server do.
+
+    python -m bench.run_load --sessions 8 --prompts 3 --latency-ms 300
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bench.mock_llm import MockLLMServer, load_script  # noqa: E402
+
+PAGES = {
+    "home": None,
+    "one_agent": "pages/one_agent.py",
+    "two_agents": "pages/two_agents.py",
+}
+DEFAULT_PROMPTS = ["Tell me a story about a dragon in Taipei", "What happened in the world today?",
+                   "Tell me a joke about cats"]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def rss_bytes() -> int:
+    """
+    Resident set size of this process, from /proc on Linux or peak RSS elsewhere.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_session(page: str, prompts: List[str], timeout: float) -> Dict[str, Any]:
+    """
+    One simulated user: open the page, send the prompts, time each rerun.
+    Runs in a worker process.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    rss_before = rss_bytes()
+    latencies, errors = [], []
+    at = AppTest.from_file(os.path.join(REPO_ROOT, "streamlit_app.py"), default_timeout=timeout).run()
+    if PAGES[page]:
+        at.switch_page(PAGES[page]).run()
+    errors.extend(e.message for e in at.exception)
+    for prompt in prompts:
+        if errors or not at.chat_input:
+            break
+        start = time.perf_counter()
+        at.chat_input[0].set_value(prompt).run()
+        latencies.append(time.perf_counter() - start)
+        errors.extend(e.message for e in at.exception)
+    return {"latencies": latencies, "errors": errors, "rss_delta": rss_bytes() - rss_before}
+
+
+def _run_session(args):
+    return run_session(*args)
+
+
+def run_page(page: str, sessions: int, prompts: List[str], timeout: float) -> Dict[str, Any]:
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes=sessions) as pool:
+        # Warm the workers (imports, model loading) so they don't count as latency.
+        pool.map(_warm_worker, range(sessions), chunksize=1)
+        start = time.perf_counter()
+        results = pool.map(_run_session, [(page, prompts, timeout)] * sessions, chunksize=1)
+        elapsed = time.perf_counter() - start
+
+    latencies = [l for r in results for l in r["latencies"]]
+    errors = [e for r in results for e in r["errors"]]
+    return {
+        "page": page,
+        "sessions": sessions,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "first_error": errors[0][:200] if errors else None,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "mean_s": statistics.mean(latencies) if latencies else None,
+        "memory_per_session_mb": statistics.mean(max(0, r["rss_delta"]) for r in results) / 2**20,
+    }
+
+
+def _warm_worker(_):
+    import streamlit.testing.v1  # noqa: F401
+    import autogen  # noqa: F401
+    import coding.agenttools  # noqa: F401
+    import coding.llm
+    import coding.router
+    coding.router.get_intent_router()
+    coding.llm.get_model_router()
+    time.sleep(0.2)  # make sure every worker process gets one warm-up task
+
+
+def format_report(rows: List[Dict[str, Any]]) -> str:
+    def fmt(value, digits=3):
+        return "-" if value is None else f"{value:.{digits}f}"
+
+    lines = [f"{'page':<12}{'sess':>6}{'reqs':>6}{'errs':>6}{'req/s':>9}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'MB/sess':>9}"]
+    for r in rows:
+        lines.append(f"{r['page']:<12}{r['sessions']:>6}{r['requests']:>6}{r['errors']:>6}"
+                     f"{fmt(r['throughput_rps'], 2):>9}{fmt(r['p50_s']):>9}{fmt(r['p95_s']):>9}"
+                     f"{fmt(r['p99_s']):>9}{fmt(r['memory_per_session_mb'], 1):>9}")
+        if r["first_error"]:
+            lines.append(f"    first error: {r['first_error']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent sessions per page")
+    parser.add_argument("--prompts", type=int, default=2, help="prompts sent by each session")
+    parser.add_argument("--pages", nargs="+", default=list(PAGES), choices=list(PAGES))
+    parser.add_argument("--latency-ms", type=float, help="mock LLM latency (overrides the script)")
+    parser.add_argument("--jitter-ms", type=float, help="mock LLM latency jitter (overrides the script)")
+    parser.add_argument("--script", help="mock LLM JSON script, see bench/mock_llm.py")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-rerun AppTest timeout")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    script = load_script(args.script) or {}
+    if args.latency_ms is not None:
+        script["latency_ms"] = args.latency_ms
+    if args.jitter_ms is not None:
+        script["jitter_ms"] = args.jitter_ms
+    server = MockLLMServer(0, script).start()
+
+    # Must be set before the pages import coding.llm.
+    os.environ.update({
+        "GEMINI_BASE_URL": server.base_url, "OPENAI_BASE_URL": server.base_url,
+        "GEMINI_API_KEY": "mock-gemini-key", "OPEN_API_KEY": "mock-openai-key",
+        "TRACE_FILE": "",
+    })
+    os.chdir(REPO_ROOT)
+
+    prompts = (DEFAULT_PROMPTS * args.prompts)[:args.prompts]
+    rows = [run_page(page, args.sessions, prompts, args.timeout) for page in args.pages]
+    print(format_report(rows))
+    print(f"mock LLM served {server.requests} requests")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
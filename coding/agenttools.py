@@ -1,9 +1,13 @@
+import hashlib
+import json
 import nltk
 import os
+import threading
 from nltk.tokenize import word_tokenize
 from wordcloud import WordCloud
 from sklearn.feature_extraction.text import TfidfVectorizer
-from coding.tools import fetch_market_data
+from coding.tools import fetch_market_data, MARKET_DATA_PATH
+from coding.tracing import span
 
 def update_market_data_and_show_preview():
     df = fetch_market_data()
@@ -16,25 +20,33 @@ def update_market_data_and_show_preview():
 
 try:
     nltk.download('punkt')  # Download punkt tokenizer
+    nltk.download('punkt_tab')  # word_tokenize needs this on NLTK >= 3.9
     nltk.download('stopwords')  # Download stopwords for text cleaning
 except Exception as e:
     print(f"Error downloading NLTK resources: {e}")
 
 
-from coding.tools import load_pdf, extract_text_by_page
+from coding.tools import load_pdf, extract_text_by_page, query_tables, DATA_DIR, PdfTable
+from coding.kvcache import get_cache
+from coding.executor import process_tool
+
+_pdf_tables = {}
+_pdf_tables_lock = threading.Lock()
 
 def extract_pdf_content():
     from PyPDF2 import PdfReader
 
     try:
-        pdf_path = "/workspaces/Gild-chatbot/data/ukr_rus.pdf"  # Replace with your actual path
+        pdf_path = os.path.join(DATA_DIR, "ukr_rus.pdf")
         reader = PdfReader(pdf_path)
 
         print(f"PDF has {len(reader.pages)} pages.")
 
         paginated_content = []
         for i, page in enumerate(reader.pages):
-            text = page.extract_text()
+            with span("extract_pdf_content", "pdf_page", page=i + 1) as page_span:
+                text = page.extract_text()
+                page_span.set(chars=len(text) if text else 0)
             print(f"Extracted page {i+1}: {len(text) if text else 0} characters")
             paginated_content.append(text if text else "[Empty Page]")
 
@@ -51,6 +63,7 @@ def tokenize_and_clean(text):
     words = [word for word in words if word not in stop_words]
     return words
 
+@process_tool(timeout=90)
 def generate_wordcloud_from_pdf():
     from coding.agenttools import extract_pdf_content  # If it's in the same file, omit this import
 
@@ -82,13 +95,83 @@ def generate_wordcloud_from_pdf():
 
     wc.generate_from_frequencies(word_tfidf)
 
-    # Specify the hardcoded save path
-    save_dir = "/workspaces/Gild-chatbot/data"  # Update this with your desired path
-    os.makedirs(save_dir, exist_ok=True)
-
-    image_path = os.path.join(save_dir, "full_wordcloud.png")
+    os.makedirs(DATA_DIR, exist_ok=True)
+    image_path = os.path.join(DATA_DIR, "full_wordcloud.png")
 
     # Save the word cloud image
     wc.to_file(image_path)
 
-    return image_path
\ No newline at end of file
+    return image_path
+
+@process_tool(timeout=120)
+def extract_pdf_pages(pdf_path: str):
+    """
+    extract_text_by_page over every page of the PDF, in the tool pool.
+    Returns (pages DataFrame, PdfTable list).
+    """
+    doc = load_pdf(pdf_path)
+    pages = extract_text_by_page(doc, max_pages=len(doc))
+    return pages, pages.attrs["tables"]
+
+
+def load_pdf_tables(pdf_path: str) -> list:
+    """
+    PdfTable records of every page of the PDF, cached per process and in
+    the shared cache by the file's content hash.
+    """
+    with open(pdf_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    with _pdf_tables_lock:
+        if digest in _pdf_tables:
+            return _pdf_tables[digest]
+    cached = get_cache().get("pdf_tables", digest)
+    if cached is not None:
+        tables = [PdfTable(**t) for t in json.loads(cached)]
+    else:
+        _, tables = extract_pdf_pages(pdf_path)
+        get_cache().put("pdf_tables", digest, json.dumps([t._asdict() for t in tables], ensure_ascii=False))
+    with _pdf_tables_lock:
+        _pdf_tables[digest] = tables
+    return tables
+
+
+def query_pdf_tables(page: int = 0, column: str = "") -> str:
+    """
+    Return rows of the tables in the PDF as JSON, optionally only those on
+    `page` (1-based, 0 for all pages) and in columns whose name contains
+    `column`.
+    """
+    tables = load_pdf_tables(os.path.join(DATA_DIR, "ukr_rus.pdf"))
+    rows = query_tables(tables, page=page or None, column=column or None)
+    if not rows:
+        return "No matching table rows found."
+    return json.dumps(rows, ensure_ascii=False)
+
+
+def summarize_pdf(lang_setting: str = "English", pdf_path: str = ""):
+    """
+    Map-reduce summary of every page of the PDF (see coding.summarize).
+    Returns a SummaryResult.
+    """
+    from coding.summarize import get_summarizer
+
+    pdf_path = pdf_path or os.path.join(DATA_DIR, "ukr_rus.pdf")
+    pages, _ = extract_pdf_pages(pdf_path)
+    return get_summarizer().summarize_pages(pages, lang_setting)
+
+def plot_market_chart(tickers: str = "", sectors: str = "", start_date: str = "", end_date: str = "",
+                      group_by: str = "ticker") -> str:
+    """
+    Chart closing prices from the local market data and return the PNG path.
+    `tickers` and `sectors` are comma-separated (empty for all companies),
+    dates are YYYY-MM-DD, group_by is "ticker" or "sector".
+    """
+    from coding.charts import render_market_chart
+
+    if not os.path.exists(MARKET_DATA_PATH):
+        fetch_market_data()
+    try:
+        return render_market_chart(tickers.split(","), sectors.split(","), start_date or None, end_date or None,
+                                   "sector" if group_by == "sector" else "ticker")
+    except ValueError as e:
+        return str(e)
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from coding.tools import MARKET_DATA_PATH, SECTOR_COMPANIES, load_market_data, market_data_version
+from coding.tracing import span
+
+# Rendered charts, one PNG per (tickers, date range, grouping, data version).
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                            ".cache", "charts"))
+# Points kept per line after downsampling.
+MAX_POINTS = 300
+# Tickers that are also ordinary words; parse_market_query only takes them in capitals.
+_WORD_TICKERS = frozenset({"AXON", "META", "COP", "MOS", "HES", "OXY"})
+# Words other than the first word of a sector's name that select it.
+_SECTOR_ALIASES = {"Technology": {"tech"}}
+_render_locks: Dict[str, threading.Lock] = {}
+_render_locks_guard = threading.Lock()
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling: indices of `threshold`
+    points that keep the visual shape (peaks and troughs) of the series.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = x.astype(float)
+    y = y.astype(float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        # Average of the next bucket is the third triangle corner.
+        avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(areas.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def _downsample(series: pd.Series, max_points: int) -> pd.Series:
+    series = series.dropna()
+    if len(series) <= max_points:
+        return series
+    index = lttb(series.index.asi8, series.to_numpy(), max_points)
+    return series.iloc[index]
+
+
+def resolve_tickers(tickers: Sequence[str] = (), sectors: Sequence[str] = ()) -> List[str]:
+    """
+    Tickers to chart: the given ones (upper-cased) plus every ticker of the
+    given sectors (matched case-insensitively by prefix, e.g. "tech", "oil").
+    All SECTOR_COMPANIES tickers when neither is given.
+    """
+    chosen = [t.strip().upper() for t in tickers if t.strip()]
+    for sector in sectors:
+        for name, members in SECTOR_COMPANIES.items():
+            if sector.strip() and name.lower().startswith(sector.strip().lower()):
+                chosen.extend(members)
+    if not chosen:
+        chosen = [t for members in SECTOR_COMPANIES.values() for t in members]
+    return sorted(set(chosen))
+
+
+def parse_market_query(prompt: str) -> Dict[str, List[str]]:
+    """
+    Pick known tickers and sector names out of a chat prompt.
+
+    Only whole words count, so "boil" is not Oil & Gas. Tickers match in
+    any case ("lmt"), except those that are also ordinary words ("meta",
+    "cop", "de"), which must be written in capitals. A sector matches the
+    first word of its name ("defense", "oil") or an alias ("tech").
+    """
+    known = {t for members in SECTOR_COMPANIES.values() for t in members}
+    words = re.findall(r"[A-Za-z]+", prompt)
+    tickers = {w.upper() for w in words
+               if w.upper() in known and (w.isupper() or (len(w) > 2 and w.upper() not in _WORD_TICKERS))}
+    lowered = {w.lower() for w in words}
+    sectors = [name for name in SECTOR_COMPANIES
+               if name.split()[0].lower() in lowered or lowered & _SECTOR_ALIASES.get(name, set())]
+    return {"tickers": sorted(tickers), "sectors": sectors}
+
+
+def chart_key(tickers: Sequence[str], start: Optional[str], end: Optional[str], group_by: str,
+              max_points: int, data_version: str) -> str:
+    payload = json.dumps([sorted(tickers), start, end, group_by, max_points, data_version])
+    return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+
+def render_market_chart(tickers: Sequence[str] = (), sectors: Sequence[str] = (), start: Optional[str] = None,
+                        end: Optional[str] = None, group_by: str = "ticker", max_points: int = MAX_POINTS,
+                        csv_path: str = MARKET_DATA_PATH) -> str:
+    """
+    Plot closing prices from the local market data and return the PNG path.
+
+    Prices are rebased to 100 at the first date so tickers are comparable.
+    group_by="sector" draws one equal-weighted line per sector instead of
+    one per ticker. Each line is downsampled with LTTB to max_points, and
+    the image is cached by ticker set, date range, grouping and data
+    version, so a repeat request only costs a file lookup.
+    """
+    chosen = resolve_tickers(tickers, sectors)
+    key = chart_key(chosen, start, end, group_by, max_points, market_data_version(csv_path))
+    path = os.path.join(CHART_CACHE_DIR, f"{key}.png")
+    with _render_locks_guard:
+        lock = _render_locks.setdefault(key, threading.Lock())
+    with lock, span("market_chart", "chart", tickers=len(chosen), group_by=group_by) as chart_span:
+        if os.path.exists(path):
+            chart_span.set(cached=True)
+            return path
+        chart_span.set(cached=False)
+
+        df = load_market_data(csv_path)
+        df = df[df["Ticker"].isin(chosen)]
+        if start:
+            df = df[df["Date"] >= pd.Timestamp(start)]
+        if end:
+            df = df[df["Date"] <= pd.Timestamp(end)]
+        if df.empty:
+            raise ValueError(f"No market data for {', '.join(chosen)} in the requested range.")
+
+        closes = df.pivot_table(index="Date", columns="Ticker", values="Close")
+        rebased = closes / closes.bfill().iloc[0] * 100
+        if group_by == "sector":
+            sector_of = {t: s for s, members in SECTOR_COMPANIES.items() for t in members}
+            lines = rebased.T.groupby(lambda t: sector_of.get(t, "Other")).mean().T
+        else:
+            lines = rebased
+
+        # Figure (not pyplot) keeps rendering thread-safe and leak-free.
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=(10, 5.5), dpi=100)
+        ax = fig.add_subplot()
+        for name in lines.columns:
+            series = _downsample(lines[name], max_points)
+            ax.plot(series.index, series.to_numpy(), linewidth=1.2, label=name)
+        ax.axhline(100, color="grey", linewidth=0.6, linestyle="--")
+        ax.set_ylabel("Close (rebased to 100)")
+        ax.set_title(f"Closing prices by {group_by}, {lines.index.min():%Y-%m} to {lines.index.max():%Y-%m}")
+        ax.grid(alpha=0.3)
+        ax.legend(fontsize=7, ncol=max(1, len(lines.columns) // 14), loc="upper left", frameon=False)
+        fig.tight_layout()
+
+        os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        fig.savefig(tmp_path, format="png")
+        os.replace(tmp_path, path)
+        return path
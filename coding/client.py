@@ -0,0 +1,64 @@
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+from coding.scheduler import llm_session
+from coding.tracing import get_tracer
+
+# Base URL of the agent service (python -m coding.service), e.g. http://127.0.0.1:8600.
+# Unset: pipelines run inside the Streamlit process.
+AGENT_SERVICE_URL = os.getenv("AGENT_SERVICE_URL", "").rstrip("/")
+# Longest a pipeline may take end to end (the teacher chat allows 120 s per attempt).
+AGENT_SERVICE_TIMEOUT = float(os.getenv("AGENT_SERVICE_TIMEOUT", "300"))
+
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+
+class AgentServiceError(RuntimeError):
+    """
+    The agent service answered with an error or could not be reached.
+    """
+
+
+def _service_client() -> httpx.Client:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(base_url=AGENT_SERVICE_URL, timeout=AGENT_SERVICE_TIMEOUT,
+                                       limits=httpx.Limits(max_connections=64, max_keepalive_connections=16))
+    return _client
+
+
+def run_pipeline(name: str, prompt: str, lang_setting: str, user_name: str, session: str,
+                 on_wait: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """
+    Run a conversation pipeline (see coding.pipelines.PIPELINES) on the
+    agent service if AGENT_SERVICE_URL is set, otherwise in this process.
+    `on_wait` (the queued notice) only applies in-process; the service does
+    its own queueing. Spans the service recorded are added to this
+    process's trace for `session`, so the trace panel shows them.
+    """
+    if not AGENT_SERVICE_URL:
+        from coding.pipelines import PIPELINES
+
+        with llm_session(session):
+            return PIPELINES[name](prompt, lang_setting, user_name, on_wait=on_wait)
+
+    try:
+        response = _service_client().post(f"/v1/pipelines/{name}", json={
+            "prompt": prompt, "lang_setting": lang_setting, "user_name": user_name, "session": session,
+        })
+    except httpx.HTTPError as e:
+        raise AgentServiceError(f"Agent service unreachable at {AGENT_SERVICE_URL}: {e}") from e
+    try:
+        result = response.json()
+    except ValueError:
+        raise AgentServiceError(f"Agent service error {response.status_code}: {response.text}")
+    get_tracer().ingest(session, result.pop("spans", None) or [])
+    if response.status_code != 200:
+        raise AgentServiceError(f"Agent service error {response.status_code}: {result.get('error')}")
+    return result
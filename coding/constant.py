@@ -13,9 +13,47 @@ JOB_DEFINITION = {
     "FALLBACK_TASK": "Politely refuses requests that cannot be fulfilled or are not defined in the agent's job definitions, ensuring respectful and appropriate responses.",
 }
 
-RESPONSE_FORMAT = {
-    "JOB": "[Job classification for the prompt]",
-    "PROMPT": "[Input from the user]"
+TOOL_DEFINITION = {
+    "PDF_SUMMARY": [
+        "Summarize the PDF document.",
+        "Give me a summary of the report.",
+        "What is the document about?",
+        "Summarise the conflict timeline file.",
+        "Show me the content of the PDF pages.",
+        "請幫我摘要這份文件",
+    ],
+    "WORDCLOUD": [
+        "Generate a wordcloud from the PDF.",
+        "Show me a word cloud.",
+        "Make a wordcloud of the document's keywords.",
+        "Which words appear most often in the PDF? Draw a word cloud.",
+        "產生文字雲",
+    ],
+    "MARKET_DATA": [
+        "Fetch the market data.",
+        "Summarize the market.",
+        "Give me a market summary for defense stocks.",
+        "Show stock prices of technology companies.",
+        "How did oil & gas tickers perform? Get market data from Yahoo Finance.",
+        "What is the stock price of Lockheed Martin (LMT)?",
+        "Show me the LMT and NOC share prices.",
+        "Plot the closing prices of NVDA and MSFT.",
+        "Chart agriculture stocks since January.",
+        "How are the defense tickers trading this week?",
+        "顯示股市資料",
+        "台積電的股價是多少？",
+    ],
+}
+
+CANNED_RESPONSES = {
+    "SELF_INTRODUCE": {
+        "English": "Hi! I'm Team02's assistant. I can summarize the PDF documents, draw a word cloud from them, fetch market data for defense, technology, agriculture and oil & gas companies, and chat about the news.",
+        "繁體中文": "嗨！我是 Team02 的助理。我可以摘要 PDF 文件、產生文字雲、抓取國防、科技、農業與油氣公司的市場資料，也可以和你聊聊新聞。",
+    },
+    "OPENING_MSG": {
+        "English": "Hello! Welcome back. What would you like to explore today?",
+        "繁體中文": "哈囉！歡迎回來，今天想探索什麼呢？",
+    },
 }
 
 EXPERTS_LIST = {
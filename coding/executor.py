@@ -0,0 +1,341 @@
+"""
+Warm process pool for CPU-heavy tools.
+
+Tools such as the word cloud and PDF table extraction hold the GIL for
+seconds; run inline they stall every other session served by the same
+process. Functions decorated with @process_tool run in a pool of
+pre-started worker processes instead, each call with its own timeout and
+resident-memory limit. A call that times out, is cancelled or exceeds its
+memory limit kills only its own worker, which is replaced in the
+background. Results come back pickled, so tools return plain values,
+DataFrames or file paths; the spans a tool records come back with them and
+are recorded by the caller under its own trace.
+"""
+import contextvars
+import functools
+import importlib
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
+
+from coding.tracing import current_trace_id, get_tracer, record_remote_spans, span, trace_session
+
+# Worker processes; 0 runs process tools inline (e.g. where spawning is not allowed).
+TOOL_PROCESSES = int(os.getenv("TOOL_PROCESSES", "2"))
+# Default per-call resident-memory (RSS) limit for a worker; 0 disables it. A
+# warm worker's RSS is ~300 MB after a PDF extraction. Address space is not
+# limited: its virtual size is already ~1.7 GB and grows with cores and BLAS threads.
+TOOL_MEMORY_LIMIT_MB = int(os.getenv("TOOL_MEMORY_LIMIT_MB", "1536"))
+# Default per-call timeout in seconds.
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "120"))
+# Imported by every worker at start so calls don't pay for them.
+WARM_MODULES = ("coding.tools", "coding.agenttools")
+
+# Set by the ModelRouter per attempt so abandoned attempts kill their tool calls.
+_cancel_event: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("tool_cancel", default=None)
+# True inside a tool worker, where nested process tools run inline.
+_in_worker = False
+
+
+class ToolFailed(RuntimeError):
+    """
+    The tool raised in its worker (message includes the worker traceback),
+    exceeded its memory limit, or its worker died.
+    """
+
+
+class ToolTimeout(ToolFailed):
+    """
+    The tool did not finish within its timeout; its worker was killed.
+    """
+
+
+class ToolCancelled(ToolFailed):
+    """
+    The call was cancelled; its worker was killed.
+    """
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    """
+    Resident set size of a process in MB, or None where /proc is unavailable.
+    The kernel does not enforce RLIMIT_RSS, so the pool polls this instead.
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def set_cancel_event(event: Optional[threading.Event]) -> None:
+    """
+    Cancel process tools called from this context when `event` is set.
+    """
+    _cancel_event.set(event)
+
+
+def cancel_requested() -> bool:
+    """
+    True once the event installed by set_cancel_event has been set, e.g. for
+    a ModelRouter attempt that was abandoned or lost a hedge.
+    """
+    event = _cancel_event.get()
+    return event is not None and event.is_set()
+
+
+def _worker_main(conn, warm_modules: Sequence[str]) -> None:
+    global _in_worker
+    _in_worker = True
+    # Unpickling this function already imported coding.tracing, so turn its file off
+    # here; spans go back to the parent with each result instead.
+    tracer = get_tracer()
+    tracer.trace_file = None
+    for module in warm_modules:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            print(f"Tool worker could not preload {module}: {e}")
+    conn.send(("ready", os.getpid()))
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+        if task is None:
+            return
+        module, qualname, args, kwargs, trace_id = task
+        trace_id = trace_id or "tool-call"
+        try:
+            target = importlib.import_module(module)
+            for part in qualname.split("."):
+                target = getattr(target, part)
+            # The module attribute is the @process_tool wrapper; run what it wraps.
+            func = getattr(target, "__wrapped__", target)
+            with trace_session(trace_id):
+                result = ("ok", func(*args, **kwargs))
+        except MemoryError:
+            # The interpreter may be left in a bad state; report and let the parent replace us.
+            conn.send(("fatal", f"{qualname} ran out of memory", []))
+            return
+        except BaseException as e:
+            result = ("error", f"{type(e).__name__}: {e}\n{traceback.format_exc()}")
+        spans = [s.to_dict() for s in tracer.take(trace_id)]
+        try:
+            conn.send(result + (spans,))
+        except Exception as e:  # unpicklable result
+            conn.send(("error", f"Could not return the result of {qualname}: {e}", spans))
+
+
+class _Worker:
+    def __init__(self, context, warm_modules: Sequence[str]):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, tuple(warm_modules)),
+                                       daemon=True, name="tool-worker")
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        if not self.ready and self.conn.poll(timeout):
+            try:
+                self.ready = self.conn.recv()[0] == "ready"
+            except (EOFError, OSError):
+                return False
+        return self.ready
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class ToolProcessPool:
+    """
+    Fixed-size pool of warm worker processes, one call per worker at a time.
+    Workers are started with "spawn" so they never inherit the server's
+    threads, locks or open sockets.
+    """
+
+    def __init__(self, size: int = TOOL_PROCESSES, warm_modules: Sequence[str] = WARM_MODULES):
+        self.size = max(1, size)
+        self.warm_modules = tuple(warm_modules)
+        self._context = multiprocessing.get_context("spawn")
+        self._cond = threading.Condition()
+        self._idle: Deque[_Worker] = deque()
+        self._workers: List[_Worker] = []
+        self._stats = {"calls": 0, "timeouts": 0, "cancelled": 0, "failures": 0, "restarts": 0}
+        self._closed = False
+        for _ in range(self.size):
+            self._start_worker()
+
+    def _start_worker(self) -> None:
+        worker = _Worker(self._context, self.warm_modules)
+        with self._cond:
+            self._workers.append(worker)
+            self._idle.append(worker)
+            self._cond.notify()
+
+    def _replace(self, worker: _Worker) -> None:
+        worker.kill()
+        with self._cond:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            self._stats["restarts"] += 1
+            closed = self._closed
+        if not closed:
+            # Spawning imports the warm modules; don't make the caller wait for it.
+            threading.Thread(target=self._start_worker, daemon=True, name="tool-worker-restart").start()
+
+    def call(self, func: Callable, args: tuple = (), kwargs: Optional[Dict[str, Any]] = None,
+             timeout: Optional[float] = TOOL_TIMEOUT, memory_mb: Optional[int] = TOOL_MEMORY_LIMIT_MB,
+             cancel: Optional[threading.Event] = None) -> Any:
+        """
+        Run func(*args, **kwargs) in a worker and return its result.
+        `func` must be importable by module and qualified name.
+
+        Raises:
+            ToolTimeout: not finished within `timeout` seconds (including
+                the wait for a free worker).
+            ToolCancelled: `cancel` (by default the caller's set_cancel_event)
+                was set before the call finished.
+            ToolFailed: the tool raised, ran out of memory or crashed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        cancel = cancel or _cancel_event.get()
+        with self._cond:
+            while not self._idle:
+                if self._closed:
+                    raise ToolFailed("Tool pool is closed")
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise ToolTimeout(f"No tool worker free within {timeout}s")
+                self._cond.wait(0.1 if remaining is None else min(remaining, 0.1))
+            worker = self._idle.popleft()
+            self._stats["calls"] += 1
+
+        healthy = False
+        try:
+            while not worker.wait_ready(0.1):
+                if not worker.process.is_alive():
+                    raise ToolFailed("Tool worker failed to start")
+                self._check(deadline, timeout, cancel)
+            worker.conn.send((func.__module__, func.__qualname__, args, kwargs or {}, current_trace_id()))
+            while not worker.conn.poll(0.1):
+                if not worker.process.is_alive():
+                    raise ToolFailed(f"Tool worker died running {func.__qualname__} "
+                                     f"(exit code {worker.process.exitcode})")
+                self._check(deadline, timeout, cancel)
+                rss = _rss_mb(worker.process.pid) if memory_mb else None
+                if rss is not None and rss > memory_mb:
+                    raise ToolFailed(f"{func.__qualname__} exceeded its {memory_mb} MB memory limit "
+                                     f"({rss:.0f} MB resident)")
+            status, payload, spans = worker.conn.recv()
+            healthy = status != "fatal"
+            record_remote_spans(spans)
+        except (EOFError, OSError) as e:
+            raise ToolFailed(f"Tool worker died running {func.__qualname__}: {e}") from e
+        except ToolFailed as e:
+            if not isinstance(e, (ToolTimeout, ToolCancelled)):  # counted by _check
+                with self._cond:
+                    self._stats["failures"] += 1
+            raise
+        finally:
+            if healthy:
+                with self._cond:
+                    self._idle.append(worker)
+                    self._cond.notify()
+            else:
+                self._replace(worker)
+
+        if status != "ok":
+            with self._cond:
+                self._stats["failures"] += 1
+            raise ToolFailed(payload)
+        return payload
+
+    def _check(self, deadline: Optional[float], timeout: Optional[float], cancel: Optional[threading.Event]) -> None:
+        if cancel is not None and cancel.is_set():
+            with self._cond:
+                self._stats["cancelled"] += 1
+            raise ToolCancelled("Tool call cancelled")
+        if deadline is not None and time.monotonic() >= deadline:
+            with self._cond:
+                self._stats["timeouts"] += 1
+            raise ToolTimeout(f"Tool did not finish within {timeout}s")
+
+    def status(self) -> Dict[str, Any]:
+        with self._cond:
+            return {**self._stats, "workers": len(self._workers), "idle": len(self._idle)}
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            workers = list(self._workers)
+            self._workers.clear()
+            self._idle.clear()
+            self._cond.notify_all()
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.kill()
+
+
+_pool: Optional[ToolProcessPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_tool_pool() -> ToolProcessPool:
+    """
+    Return the process-wide tool pool, starting its workers on first use.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ToolProcessPool()
+    return _pool
+
+
+def tool_pool_status() -> Optional[Dict[str, Any]]:
+    """
+    Status of the tool pool, or None if no process tool has run yet.
+    """
+    return _pool.status() if _pool is not None else None
+
+
+def close_tool_pool() -> None:
+    """
+    Stop the tool pool's workers if it was started.
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+def process_tool(timeout: Optional[float] = TOOL_TIMEOUT, memory_mb: Optional[int] = TOOL_MEMORY_LIMIT_MB):
+    """
+    Decorator: run the function in the tool pool (inline when TOOL_PROCESSES
+    is 0 or when already inside a tool worker). functools.wraps keeps the
+    signature ag2 turns into the tool schema. The function's arguments and
+    result must be picklable.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if TOOL_PROCESSES <= 0 or _in_worker:
+                return func(*args, **kwargs)
+            with span(func.__name__, "process_tool", timeout=timeout, memory_mb=memory_mb):
+                return get_tool_pool().call(wrapper, args, kwargs, timeout=timeout, memory_mb=memory_mb)
+        return wrapper
+    return decorator
@@ -0,0 +1,133 @@
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+
+from coding.scheduler import ScheduledTransport
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Sized for one Streamlit process serving many sessions.
+DEFAULT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=120.0)
+DEFAULT_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+# httpcore trace events that mean a new connection (and TLS handshake) was opened.
+_CONNECT_EVENT = "connection.connect_tcp.complete"
+_TLS_EVENT = "connection.start_tls.complete"
+
+
+class _CountingTransport(httpx.BaseTransport):
+    """
+    Counts requests, responses and errors around the inner transport, so
+    requests that raise (connect errors, timeouts) still leave in_flight.
+    """
+
+    def __init__(self, owner: "PooledClient", transport: httpx.BaseTransport):
+        self.owner = owner
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions["trace"] = self.owner._trace
+        self.owner._count("requests")
+        self.owner._count("in_flight")
+        try:
+            response = self.transport.handle_request(request)
+        except Exception:
+            self.owner._count("errors")
+            raise
+        finally:
+            self.owner._count("in_flight", -1)
+        self.owner._count("responses")
+        if response.status_code >= 400:
+            self.owner._count("errors")
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class PooledClient:
+    """
+    A process-wide httpx.Client for one provider, with keep-alive pooling,
+    HTTP/2 when `h2` is installed, and request/connection counters.
+    """
+
+    def __init__(self, provider: str, limits: httpx.Limits = DEFAULT_LIMITS,
+                 timeout: httpx.Timeout = DEFAULT_TIMEOUT, http2: Optional[bool] = None):
+        self.provider = provider
+        self.http2 = HTTP2_AVAILABLE if http2 is None else http2
+        self._lock = threading.Lock()
+        self._metrics = {"requests": 0, "responses": 0, "errors": 0, "in_flight": 0,
+                         "connections_opened": 0, "tls_handshakes": 0}
+        # Every request is admitted by the process-wide LLMScheduler before
+        # it reaches the pooled transport.
+        self.client = httpx.Client(
+            transport=_CountingTransport(
+                self, ScheduledTransport(httpx.HTTPTransport(limits=limits, http2=self.http2))),
+            timeout=timeout,
+        )
+
+    def _count(self, key: str, delta: int = 1) -> None:
+        with self._lock:
+            self._metrics[key] += delta
+
+    def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == _CONNECT_EVENT:
+            self._count("connections_opened")
+        elif event_name == _TLS_EVENT:
+            self._count("tls_handshakes")
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Counters plus the current pool state. Pool internals are read
+        defensively since httpcore does not expose them publicly.
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+        transport = getattr(self.client, "_transport", None)
+        while hasattr(transport, "transport"):  # unwrap counting and scheduling layers
+            transport = transport.transport
+        pool = getattr(transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        metrics["pool_connections"] = len(connections)
+        metrics["pool_idle"] = sum(1 for c in connections if getattr(c, "is_idle", lambda: False)())
+        metrics["http2"] = self.http2
+        return metrics
+
+
+_clients: Dict[str, PooledClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_http_client(provider: str) -> httpx.Client:
+    """
+    Return the shared httpx.Client for a provider ("google", "openai", ...),
+    creating it on first use. Pass it as `http_client` in an LLMConfig.
+    """
+    pooled = _clients.get(provider)
+    if pooled is None:
+        with _clients_lock:
+            pooled = _clients.get(provider)
+            if pooled is None:
+                pooled = _clients[provider] = PooledClient(provider)
+    return pooled.client
+
+
+def pool_metrics() -> Dict[str, Dict[str, Any]]:
+    """
+    Metrics for every provider client created so far.
+    """
+    with _clients_lock:
+        pooled = dict(_clients)
+    return {provider: client.metrics() for provider, client in pooled.items()}
+
+
+def close_http_clients() -> None:
+    with _clients_lock:
+        for pooled in _clients.values():
+            pooled.client.close()
+        _clients.clear()
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+# SQLite file shared by every Streamlit and agent-service process on the host;
+# anchored to the repository so processes started elsewhere still share it.
+CACHE_DB = os.getenv("CACHE_DB", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                              ".cache", "cache.sqlite3"))
+
+
+class KVCache:
+    """
+    Small string key-value store in SQLite, split into namespaces.
+
+    WAL mode lets any number of processes read while one writes, so agent
+    service workers share summaries and extracted tables instead of each
+    recomputing them. Connections are per thread (sqlite3 objects must not
+    cross threads). If the database cannot be opened the cache degrades to
+    always missing rather than failing requests.
+    """
+
+    def __init__(self, path: str = CACHE_DB):
+        self.path = path
+        self._local = threading.local()
+        self._disabled = False
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._disabled:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS kv (namespace TEXT NOT NULL, key TEXT NOT NULL, "
+                    "value TEXT NOT NULL, updated REAL NOT NULL, PRIMARY KEY (namespace, key))"
+                )
+            except sqlite3.Error as e:
+                print(f"Disabling cache {self.path}: {e}")
+                self._disabled = True
+                return None
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        conn = self._connection()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute("SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Cache read failed: {e}")
+            return None
+        return row[0] if row else None
+
+    def put(self, namespace: str, key: str, value: str) -> None:
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            conn.execute("INSERT OR REPLACE INTO kv (namespace, key, value, updated) VALUES (?, ?, ?, ?)",
+                         (namespace, key, value, time.time()))
+        except sqlite3.Error as e:
+            print(f"Cache write failed: {e}")
+
+
+_cache: Optional[KVCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> KVCache:
+    """
+    Return this process's handle on the shared cache database.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = KVCache()
+    return _cache
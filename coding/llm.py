@@ -0,0 +1,330 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, TypeVar
+
+from autogen import LLMConfig
+from dotenv import load_dotenv
+
+from coding.http_clients import get_http_client
+from coding.executor import set_cancel_event
+
+# Pages import this module before calling load_dotenv themselves.
+load_dotenv(override=True)
+
+# https://ai.google.dev/gemini-api/docs/pricing
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', None)
+OPEN_API_KEY = os.getenv('OPEN_API_KEY', None)
+
+# Override these to point the app at a local stub server.
+GEMINI_BASE_URL = os.getenv('GEMINI_BASE_URL', "https://generativelanguage.googleapis.com/v1beta/openai/")
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', None)
+
+# Task complexity levels used to pick a model.
+SIMPLE = 1    # single-shot text, e.g. the storyteller
+STANDARD = 2  # tool use or multi-turn reasoning
+
+# Seconds between on_wait callbacks in ModelRouter.run.
+ON_WAIT_INTERVAL = 0.5
+# Threads running router attempts. A conversation holds one for its whole
+# duration, so this bounds concurrent conversations (service requests, PDF
+# summary chunks and abandoned attempts still winding down) per process.
+# The PDF summarizer uses at most a quarter of them per document.
+LLM_ROUTER_THREADS = int(os.getenv("LLM_ROUTER_THREADS", "64"))
+
+T = TypeVar("T")
+
+
+class ModelRoute(NamedTuple):
+    name: str
+    provider: str
+    llm_config: LLMConfig
+    capability: int
+    expected_latency: float  # prior latency (seconds) before anything is observed
+    api_key: Optional[str]
+
+    def attempt(self) -> "ModelRoute":
+        """
+        A copy of the route for one attempt. `with llm_config:` keeps its
+        context token on the LLMConfig itself, so concurrent attempts each
+        need their own (the pooled http_client is shared).
+        """
+        return self._replace(llm_config=self.llm_config.copy())
+
+
+class AllRoutesFailed(RuntimeError):
+    """
+    Every candidate route failed or timed out, or no router thread was free
+    to start the attempt in time.
+    """
+
+
+def _llm_config(provider: str, model: str, api_key: Optional[str], price: Optional[List[float]] = None) -> LLMConfig:
+    """
+    LLMConfig for a model, sharing the provider's pooled HTTP client.
+
+    Gemini is reached through its OpenAI-compatible endpoint: ag2's native
+    google client opens a new genai.Client (and TLS connection) on every call
+    and cannot be handed a shared httpx client.
+    """
+    entry = {"api_type": "openai", "model": model, "api_key": api_key, "http_client": get_http_client(provider)}
+    base_url = GEMINI_BASE_URL if provider == "google" else OPENAI_BASE_URL
+    if base_url:
+        entry["base_url"] = base_url
+    if price:
+        entry["price"] = price  # per 1k input/output tokens, ag2 has no table for Gemini
+    return LLMConfig(**entry)
+
+
+def build_routes() -> List[ModelRoute]:
+    """
+    The Gemini and OpenAI models this app can use, cheapest first.
+    """
+    return [
+        ModelRoute(
+            "gemini-2.0-flash-lite", "google",
+            _llm_config("google", "gemini-2.0-flash-lite", GEMINI_API_KEY, price=[0.000075, 0.0003]),
+            SIMPLE, 2.0, GEMINI_API_KEY,
+        ),
+        ModelRoute(
+            "gemini-2.0-flash", "google",
+            _llm_config("google", "gemini-2.0-flash", GEMINI_API_KEY, price=[0.0001, 0.0004]),
+            STANDARD, 3.0, GEMINI_API_KEY,
+        ),
+        ModelRoute(
+            "gpt-4o-mini", "openai",
+            _llm_config("openai", "gpt-4o-mini", OPEN_API_KEY),
+            STANDARD, 4.0, OPEN_API_KEY,
+        ),
+    ]
+
+
+def estimate_complexity(prompt: str, needs_tools: bool = False) -> int:
+    """
+    Rough task complexity: tool use or a long prompt needs a standard model.
+    """
+    if needs_tools or len(prompt) > 2000:
+        return STANDARD
+    return SIMPLE
+
+
+def is_retriable(error: BaseException) -> bool:
+    """
+    True for provider-side failures worth failing over: timeouts, 429s,
+    5xx responses and connection errors from either SDK.
+    """
+    if isinstance(error, (TimeoutError, FutureTimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int) and (status == 429 or status >= 500):
+        return True
+    name = type(error).__name__
+    if any(k in name for k in ("RateLimit", "Timeout", "Connection", "ServiceUnavailable", "ResourceExhausted", "ServerError")):
+        return True
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message
+
+
+def retry_after(error: BaseException, default: float) -> float:
+    """
+    Seconds to keep a rate-limited route cooling down, from Retry-After if present.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", default))
+    except (TypeError, ValueError):
+        return default
+
+
+class ModelRouter:
+    """
+    Chooses a model per request from observed latency and error rates, fails
+    over to the other provider on timeouts or 429s, and can hedge a slow
+    request by racing a second provider.
+    """
+
+    def __init__(self, routes: List[ModelRoute], alpha: float = 0.3, rate_limit_cooldown: float = 30.0,
+                 timeout_cooldown: float = 10.0, hedge_after: Optional[float] = None,
+                 max_workers: int = LLM_ROUTER_THREADS):
+        self.routes = routes
+        self.alpha = alpha
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self.timeout_cooldown = timeout_cooldown
+        self.hedge_after = hedge_after
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {
+            r.name: {"latency": r.expected_latency, "error_rate": 0.0, "cooldown_until": 0.0,
+                     "requests": 0, "errors": 0}
+            for r in routes
+        }
+        # Attempts run here so a hung request can be abandoned at its deadline.
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-route")
+
+    def candidates(self, complexity: int = SIMPLE) -> List[ModelRoute]:
+        """
+        Routes able to handle the complexity, best first. Cooling-down routes
+        are kept at the end as a last resort rather than dropped.
+        """
+        usable = [r for r in self.routes if r.api_key] or list(self.routes)
+        capable = [r for r in usable if r.capability >= complexity] or usable
+        now = time.monotonic()
+        with self._lock:
+            def score(route: ModelRoute):
+                stats = self._stats[route.name]
+                # Over-qualified models cost more, so only win when clearly faster.
+                overkill = 1 + 0.5 * (route.capability - complexity)
+                return (stats["cooldown_until"] > now,
+                        stats["latency"] * (1 + 4 * stats["error_rate"]) * overkill)
+            return sorted(capable, key=score)
+
+    def record(self, route: ModelRoute, latency: float, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            stats = self._stats[route.name]
+            stats["requests"] += 1
+            stats["error_rate"] = (1 - self.alpha) * stats["error_rate"] + self.alpha * (error is not None)
+            if error is None:
+                stats["latency"] = (1 - self.alpha) * stats["latency"] + self.alpha * latency
+                return
+            stats["errors"] += 1
+            if isinstance(error, (TimeoutError, FutureTimeoutError)):
+                stats["latency"] = max(stats["latency"], latency)
+                stats["cooldown_until"] = time.monotonic() + self.timeout_cooldown
+            elif is_retriable(error):
+                stats["cooldown_until"] = time.monotonic() + retry_after(error, self.rate_limit_cooldown)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def run(self, task: Callable[[ModelRoute], T], complexity: int = SIMPLE, timeout: Optional[float] = 60.0,
+            hedge_after: Optional[float] = None, on_wait: Optional[Callable[[], None]] = None) -> T:
+        """
+        Run task(route) on the best route, failing over on retriable errors.
+
+        Args:
+            task: Builds agents from route.llm_config and runs the conversation.
+            complexity: SIMPLE or STANDARD, see estimate_complexity().
+            timeout: Seconds before an attempt is abandoned and the next route tried,
+                counted from when the attempt starts on a router thread. An attempt
+                still waiting for a thread after `timeout` is dropped without blaming
+                its route. A started attempt that is abandoned keeps running until
+                its next message (the termination controller stops it); its result
+                is dropped and its process tools (coding.executor) are cancelled.
+            hedge_after: Start a second provider if the first has not answered
+                after this many seconds. Defaults to the router's hedge_after.
+            on_wait: Called about twice a second while waiting, e.g. to show
+                the user that their request is queued.
+
+        Returns:
+            The first successful task result.
+
+        Raises:
+            AllRoutesFailed: no route succeeded.
+        """
+        hedge_after = self.hedge_after if hedge_after is None else hedge_after
+        queue = self.candidates(complexity)
+        running: Dict[Any, tuple] = {}
+        cancels: Dict[Any, threading.Event] = {}
+        last_error: Optional[BaseException] = None
+        hedged = False
+
+        def launch(avoid_provider: Optional[str] = None):
+            # Prefer the other provider after a failure or for a hedge.
+            index = next((i for i, r in enumerate(queue) if r.provider != avoid_provider), 0)
+            route = queue.pop(index)
+            # Carry the caller's context (LLM priority, session tag) into the worker thread.
+            context = contextvars.copy_context()
+            cancel = threading.Event()
+            context.run(set_cancel_event, cancel)
+            started: Dict[str, float] = {}
+
+            def run_attempt(attempt: ModelRoute):
+                # The deadline runs from here: time queued for a thread is not the model's latency.
+                started["at"] = time.monotonic()
+                return task(attempt)
+
+            future = self._executor.submit(context.run, run_attempt, route.attempt())
+            running[future] = (route, started, time.monotonic())
+            cancels[future] = cancel
+
+        def start_of(entry: tuple) -> float:
+            _, started, submitted = entry
+            return started.get("at", submitted)
+
+        launch()
+        first_start = time.monotonic()
+        while running:
+            now = time.monotonic()
+            deadlines = [start_of(entry) + timeout for entry in running.values()] if timeout else []
+            if hedge_after is not None and queue and not hedged:
+                deadlines.append(first_start + hedge_after)
+            wait_time = max(0.0, min(deadlines) - now) if deadlines else None
+            if on_wait is not None:
+                on_wait()
+                wait_time = ON_WAIT_INTERVAL if wait_time is None else min(wait_time, ON_WAIT_INTERVAL)
+            done, _ = wait(list(running), timeout=wait_time, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                entry = running.pop(future)
+                route, start = entry[0], start_of(entry)
+                cancels.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if not is_retriable(e):
+                        raise
+                    self.record(route, time.monotonic() - start, e)
+                    print(f"{route.name} failed ({type(e).__name__}: {e}), failing over...")
+                    last_error = e
+                    if not running and queue:
+                        launch(avoid_provider=route.provider)
+                    continue
+                self.record(route, time.monotonic() - start)
+                for cancel in cancels.values():  # losing hedges
+                    cancel.set()
+                return result
+
+            now = time.monotonic()
+            for future, entry in list(running.items()):
+                route, started, start = entry[0], entry[1], start_of(entry)
+                if not timeout or now - start < timeout:
+                    continue
+                running.pop(future)
+                cancels.pop(future).set()
+                if "at" not in started and future.cancel():
+                    # Never got a thread; the route is not to blame and another would wait too.
+                    last_error = TimeoutError(f"No router thread free within {timeout}s")
+                    print(f"{last_error} for {route.name}")
+                    continue
+                last_error = TimeoutError(f"{route.name} did not answer within {timeout}s")
+                self.record(route, now - start, last_error)
+                print(f"{last_error}, failing over...")
+                if not running and queue:
+                    launch(avoid_provider=route.provider)
+            if hedge_after is not None and queue and not hedged and running and now - first_start >= hedge_after:
+                hedged = True
+                launch(avoid_provider=next(iter(running.values()))[0].provider)
+
+        raise AllRoutesFailed("All LLM routes failed; check GEMINI_API_KEY / OPEN_API_KEY.") from last_error
+
+
+_model_router: Optional[ModelRouter] = None
+_model_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """
+    Return the process-wide ModelRouter so latency and error stats are shared by all sessions.
+    Set LLM_HEDGE_AFTER (seconds) to hedge slow requests by default.
+    """
+    global _model_router
+    if _model_router is None:
+        with _model_router_lock:
+            if _model_router is None:
+                hedge_after = os.getenv("LLM_HEDGE_AFTER")
+                _model_router = ModelRouter(build_routes(), hedge_after=float(hedge_after) if hedge_after else None)
+    return _model_router
@@ -0,0 +1,284 @@
+"""
+Conversation pipelines, independent of Streamlit.
+
+Each pipeline takes the user's prompt and settings and returns a
+JSON-serializable dict, so it can run in-process or in the agent service
+(coding/service.py) behind several worker processes. The pages only call
+run_pipeline() through coding.client.
+"""
+import base64
+import json
+import os
+import re
+from typing import Any, Callable, Dict, Optional
+
+from autogen import AssistantAgent, ConversableAgent, UserProxyAgent, register_function
+from autogen.code_utils import content_str
+
+from coding.llm import estimate_complexity, get_model_router
+from coding.prompts import STORY_PROMPT, STUDENT_PERSONA, TEACHER_PERSONA, TOOL_AGENT_SYSTEM
+from coding.router import canned_response, get_intent_router
+from coding.summarize import local_summary_method
+from coding.termination import DONE_MARKER, TerminationController, register_finish_tool, strip_stop_signal
+from coding.tracing import instrument_agents, span, traced_tool
+
+# Per-conversation budgets (messages between the agents, seconds); the time
+# budgets match the router timeouts so abandoned attempts stop too.
+STORY_MAX_TURNS = 4
+TOOLS_MAX_TURNS = 12
+TEACHER_MAX_TURNS = 20
+STORY_TIMEOUT = 30
+TOOLS_TIMEOUT = 60
+TEACHER_TIMEOUT = 120
+# Prompts that ask market_chart to re-download prices instead of charting the
+# local file. "Fetch" and "Yahoo" are not among them: they are how people ask
+# for the chart itself, and a refresh is 38 blocking downloads.
+_REFRESH_MARKET_DATA = re.compile(
+    r"\b(?:refresh|reload|re-?download)\b|\bupdate\s+(?:the\s+)?(?:market\s+)?(?:data|prices)\b", re.IGNORECASE
+)
+
+
+def build_story_agents(route, controller: TerminationController):
+    """
+    Build the storyteller and its proxy on the model chosen by the router.
+    """
+    with route.llm_config:
+        assistant = AssistantAgent(
+            name="assistant",
+            system_message=(
+            "You are a helpful storyteller assistant. "
+            f"Please give me a story. End the response that contains the story with '{DONE_MARKER}'."
+            ),
+            max_consecutive_auto_reply=2,
+            is_termination_msg=controller,
+            human_input_mode="NEVER",
+        )
+
+    user_proxy = UserProxyAgent(
+        "user_proxy",
+        human_input_mode="NEVER",
+        code_execution_config=False,
+        is_termination_msg=controller,
+    )
+    instrument_agents(assistant, user_proxy)
+    return assistant, user_proxy
+
+
+def story(prompt: str, lang_setting: str, user_name: str, on_wait: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    # Canned intents are answered locally; everything else goes to the LLM.
+    canned = canned_response(get_intent_router().route(prompt), lang_setting)
+    if canned:
+        return {"reply": canned}
+
+    # Static instructions come first so the provider can cache them as a prefix.
+    prompt_vars = {"prompt": prompt, "user_name": user_name, "lang_setting": lang_setting}
+    prompt_template = STORY_PROMPT.render(**prompt_vars)
+
+    def run_story(route):
+        controller = TerminationController("story", max_turns=STORY_MAX_TURNS, max_seconds=STORY_TIMEOUT)
+        assistant, user_proxy = build_story_agents(route, controller)
+        try:
+            result = user_proxy.initiate_chat(
+            recipient=assistant,
+            message=prompt_template
+            )
+        finally:
+            report = controller.finish()
+        return result, report
+
+    with span("story", "conversation", **STORY_PROMPT.token_counts(**prompt_vars)):
+        result, report = get_model_router().run(run_story, complexity=estimate_complexity(prompt),
+                                                timeout=STORY_TIMEOUT, on_wait=on_wait)
+    reply = strip_stop_signal(content_str(result.summary))
+    if not reply:
+        # The marker came in a message of its own; the story is the last one with text.
+        replies = [strip_stop_signal(content_str(m.get("content"))) for m in result.chat_history
+                   if m.get("name") == "assistant"]
+        reply = next((r for r in reversed(replies) if r), "")
+    return {"reply": reply, "termination": report._asdict()}
+
+
+def build_tool_agents(route, lang_setting: str, controller: TerminationController):
+    """
+    Build the tool-using agent and the proxy that executes its tools.
+    """
+    from coding.agenttools import (extract_pdf_content, generate_wordcloud_from_pdf, plot_market_chart,
+                                   query_pdf_tables, update_market_data_and_show_preview)
+
+    methods_to_register = [
+        ("extract_pdf_content", "Extracts text (and tables) from a hardcoded PDF file.", extract_pdf_content),
+        ("query_pdf_tables", "Query the tables in the PDF by page number and/or column name; returns JSON rows.", query_pdf_tables),
+        ("generate_wordcloud_from_pdf", "Generate a word cloud from the entire PDF.", generate_wordcloud_from_pdf),
+        ("fetch_market_data", "Fetch Market data from Yahoo Finance", update_market_data_and_show_preview),
+        ("plot_market_chart", "Chart closing prices of the local market data by ticker or sector; returns the image path.", plot_market_chart)
+    ]
+
+    # Instantiate the agent on the model chosen by the router
+    with route.llm_config:
+        gemini_agent = ConversableAgent(
+            name="Gemini_Agent",
+            system_message=TOOL_AGENT_SYSTEM.render(lang_setting=lang_setting),
+            is_termination_msg=controller,
+            human_input_mode="NEVER",
+        )
+
+    # Set up user proxy
+    user_proxy = UserProxyAgent(
+        "user_proxy",
+        human_input_mode="NEVER",
+        code_execution_config=False,
+        is_termination_msg=controller,
+    )
+
+    for name, description, func in methods_to_register:
+        func = traced_tool(func)
+        gemini_agent.register_for_llm(name=name, description=description)(func)
+        user_proxy.register_for_execution(name=name)(func)
+    register_finish_tool(gemini_agent, user_proxy)
+
+    instrument_agents(gemini_agent, user_proxy)
+    return gemini_agent, user_proxy
+
+
+def tools(prompt: str, lang_setting: str, user_name: str, on_wait: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    def run_chat(route):
+        controller = TerminationController("tool_chat", max_turns=TOOLS_MAX_TURNS, max_seconds=TOOLS_TIMEOUT)
+        gemini_agent, user_proxy = build_tool_agents(route, lang_setting, controller)
+        try:
+            chat_result = user_proxy.initiate_chat(
+                gemini_agent,
+                message=prompt,
+            )
+        finally:
+            report = controller.finish()
+        return chat_result, report
+
+    with span("tool_chat", "conversation"):
+        chat_result, report = get_model_router().run(
+            run_chat, complexity=estimate_complexity(prompt, needs_tools=True), timeout=TOOLS_TIMEOUT,
+            on_wait=on_wait)
+    return {"messages": chat_result.chat_history, "termination": report._asdict()}
+
+
+def build_teacher_agents(route, lang_setting: str, controller: TerminationController):
+    """
+    Build the student and the tool-using teacher.
+    """
+    from coding.agenttools import AG_search_expert, AG_search_news, AG_search_textbook, get_time
+
+    with route.llm_config:
+        student_agent = ConversableAgent(
+            name="Student_Agent",
+            system_message=STUDENT_PERSONA.render(lang_setting=lang_setting),
+            is_termination_msg=controller,
+            human_input_mode="NEVER",
+        )
+
+        teacher_agent = ConversableAgent(
+            name="Teacher_Agent",
+            system_message=TEACHER_PERSONA.render(lang_setting=lang_setting),
+            is_termination_msg=controller,
+            human_input_mode="NEVER",
+        )
+
+    register_function(
+        traced_tool(AG_search_expert),
+        caller=teacher_agent,
+        executor=student_agent,
+        description="Search EXPERTS_LIST by name, discipline, or interest.",
+    )
+
+    register_function(
+        traced_tool(AG_search_textbook),
+        caller=teacher_agent,
+        executor=student_agent,
+        description="Search TEXTBOOK_LIST by title, discipline, or related_expert.",
+    )
+
+    register_function(
+        traced_tool(AG_search_news),
+        caller=teacher_agent,
+        executor=student_agent,
+        description="Search a pre-fetched news DataFrame by keywords, sections, and date range.",
+    )
+
+    register_function(
+        traced_tool(get_time),
+        caller=teacher_agent,
+        executor=student_agent,
+        description="Get the current date & time.",
+    )
+    register_finish_tool(teacher_agent, student_agent)
+
+    instrument_agents(student_agent, teacher_agent)
+    return student_agent, teacher_agent
+
+
+def teacher(prompt: str, lang_setting: str, user_name: str, on_wait: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    def run_chat(route):
+        controller = TerminationController("teacher_chat", max_turns=TEACHER_MAX_TURNS, max_seconds=TEACHER_TIMEOUT)
+        student_agent, teacher_agent = build_teacher_agents(route, lang_setting, controller)
+        try:
+            chat_result = student_agent.initiate_chat(
+                teacher_agent,
+                message = prompt,
+                summary_method=local_summary_method,
+                max_turns=TEACHER_MAX_TURNS // 2,
+            )
+        finally:
+            report = controller.finish()
+        return chat_result, report
+
+    with span("teacher_chat", "conversation"):
+        chat_result, report = get_model_router().run(
+            run_chat, complexity=estimate_complexity(prompt, needs_tools=True), timeout=TEACHER_TIMEOUT,
+            on_wait=on_wait)
+    return {"messages": chat_result.chat_history, "termination": report._asdict()}
+
+
+def _png(path: str) -> str:
+    # Images travel as base64 so the UI does not need the service's filesystem.
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode("ascii")
+
+
+def wordcloud(prompt: str, lang_setting: str, user_name: str, on_wait: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    from coding.agenttools import generate_wordcloud_from_pdf
+
+    with span("wordcloud", "conversation"):
+        return {"image": _png(generate_wordcloud_from_pdf())}
+
+
+def market_chart(prompt: str, lang_setting: str, user_name: str, on_wait: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    from coding.charts import parse_market_query, render_market_chart, resolve_tickers
+    from coding.tools import MARKET_DATA_PATH, fetch_market_data, load_market_data
+
+    with span("market_chart", "conversation"):
+        # Refresh from Yahoo Finance only when asked to (or when there is no local data yet).
+        if not os.path.exists(MARKET_DATA_PATH) or _REFRESH_MARKET_DATA.search(prompt):
+            if fetch_market_data() is None:
+                return {"error": "No market data retrieved."}
+        query = parse_market_query(prompt)
+        group_by = "ticker" if query["tickers"] or query["sectors"] else "sector"
+        image_path = render_market_chart(query["tickers"], query["sectors"], group_by=group_by)
+        df = load_market_data()
+        recent = df[df["Ticker"].isin(resolve_tickers(query["tickers"], query["sectors"]))].tail(10)
+    return {"image": _png(image_path), "table": json.loads(recent.to_json(orient="records", date_format="iso"))}
+
+
+def pdf_summary(prompt: str, lang_setting: str, user_name: str, on_wait: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    from coding.agenttools import summarize_pdf
+
+    with span("pdf_summary", "conversation"):
+        result = summarize_pdf(lang_setting)
+    return result._asdict()
+
+
+PIPELINES: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "story": story,
+    "tools": tools,
+    "teacher": teacher,
+    "pdf_summary": pdf_summary,
+    "wordcloud": wordcloud,
+    "market_chart": market_chart,
+}
@@ -0,0 +1,136 @@
+from typing import Dict
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken missing or encoding files unavailable offline
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count prompt tokens with the gpt-4o tokenizer, or estimate ~4 chars per token.
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4) if text else 0
+
+
+class PromptTemplate:
+    """
+    A prompt split into a static prefix and a variable suffix.
+
+    The prefix is assembled once at import time and never changes between
+    requests, so providers that cache prompt prefixes (OpenAI, Gemini) can
+    reuse it. Everything that varies per request (language, user name,
+    prompt) lives in the suffix, which is a str.format template.
+    """
+
+    def __init__(self, name: str, static: str, variable: str):
+        self.name = name
+        self.prefix = static.strip() + "\n\n"
+        self.variable = variable.strip()
+        self.prefix_tokens = count_tokens(self.prefix)
+
+    def render(self, **variables: str) -> str:
+        return self.prefix + self.variable.format(**variables)
+
+    def token_counts(self, **variables: str) -> Dict[str, int]:
+        """
+        Return prefix, variable and total token counts for the rendered prompt.
+        """
+        variable_tokens = count_tokens(self.variable.format(**variables))
+        return {
+            "prefix_tokens": self.prefix_tokens,
+            "variable_tokens": variable_tokens,
+            "total_tokens": self.prefix_tokens + variable_tokens,
+        }
+
+
+STORY_PROMPT = PromptTemplate(
+    "story",
+    static=(
+        "Give me a story started from the opening line given below. "
+        "Remember to mention the user's name given below in the end. "
+        "Add some emoji in the end of each sentence."
+    ),
+    variable=(
+        "User's name: {user_name}\n"
+        "Please express in {lang_setting}\n"
+        "Opening line: '{prompt}'"
+    ),
+)
+
+TOOL_AGENT_SYSTEM = PromptTemplate(
+    "tool_agent",
+    static=(
+        "You are a helpful assistant. Use the registered tools to complete tasks. "
+        "When the task is complete, call `finish_conversation`, or end your final reply with 'ALL DONE'."
+    ),
+    variable="Respond in {lang_setting}.",
+)
+
+CHUNK_SUMMARY_PROMPT = PromptTemplate(
+    "chunk_summary",
+    static=(
+        "Summarize the following excerpt of a longer document in at most 120 words. "
+        "Keep dates, names, numbers and decisions; drop repetition and boilerplate. "
+        "Output the summary only."
+    ),
+    variable=(
+        "Please output in {lang_setting}\n"
+        "Excerpt (pages {pages}):\n{text}"
+    ),
+)
+
+REDUCE_SUMMARY_PROMPT = PromptTemplate(
+    "reduce_summary",
+    static=(
+        "Combine the following partial summaries of consecutive parts of one document "
+        "into a single coherent summary of at most 200 words, in document order. "
+        "Keep dates, names, numbers and decisions. Output the summary only."
+    ),
+    variable=(
+        "Please output in {lang_setting}\n"
+        "Partial summaries:\n{text}"
+    ),
+)
+
+CHAT_SUMMARY_PROMPT = PromptTemplate(
+    "chat_summary",
+    static=(
+        "Summarize the following conversation in at most 120 words: what was asked, "
+        "what was found and what was concluded. Output the summary only."
+    ),
+    variable=(
+        "Please output in {lang_setting}\n"
+        "Conversation:\n{text}"
+    ),
+)
+
+STUDENT_PERSONA = PromptTemplate(
+    "student",
+    static="You are a student willing to learn. After your result, say 'ALL DONE'.",
+    variable="Please output in {lang_setting}",
+)
+
+TEACHER_PERSONA = PromptTemplate(
+    "teacher",
+    static="""You are a teacher. Please try to use tools to answer student's question according to the following rules:
+    1. Check current time: use `get_time` tool to retrieve current date and time.
+    2. Search news by `AG_search_news` according to user's question, try to distill student's question within 1~2 words and facilitate it as query string. Also you may search by sections,  e.g. ['Taiwan News', 'World News', 'Sports', 'Front Page', 'Features', 'Editorials', 'Business','Bilingual Pages'], if you cannot distill it, use None instead.
+    3. From the return news, randomly pick one news. Classify the news to the following <DISCIPLINE>:
+    <DISCIPLINE>
+        "Digital Sociology"
+        "Information Systems Strategy"
+        "Technology and Society"
+        "Empathetic and research-driven"
+        "Computational Social Science"
+    </DISCIPLINE>
+    4. Use `AG_search_expert` to select expert by <DISCIPLINE>, also Use `AG_search_textbook` to select a textbook by <DISCIPLINE>.
+    5. Explain to student a interesting essay within 500 words about the news using expert and textbook. Please remember to mention about the expert and textbook you cite.
+    6. Please output in the language given at the end.
+    7. When the essay is delivered, call `finish_conversation`, or end your reply with 'ALL DONE'.
+    """,
+    variable="Language: {lang_setting}",
+)
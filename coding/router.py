@@ -0,0 +1,186 @@
+import glob
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import hstack
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+
+from coding.constant import CANNED_RESPONSES, JOB_DEFINITION, TOOL_DEFINITION
+
+CHAT_LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chat_logs")
+
+# Below this probability the router does not trust itself and the caller
+# should hand the prompt to the LLM instead.
+DEFAULT_THRESHOLD = 0.35
+# Tool labels start multi-call work (a map-reduce PDF summary, a market data
+# fetch), so they need stronger evidence than a job label.
+TOOL_THRESHOLD = 0.5
+
+# Prompts that carry an explicit job prefix never need a model.
+PREFIX_JOBS = {
+    "[OPENING_MSG]": "OPENING_MSG",
+    "[REPLY_TASK]": "REPLY_TASK",
+}
+
+
+class Intent(NamedTuple):
+    label: Optional[str]
+    confidence: float
+    kind: str  # "tool", "job" or "llm"
+    elapsed_ms: float
+
+
+def _definition_examples(definition) -> List[str]:
+    """
+    Split a JOB_DEFINITION entry into training sentences, including any
+    quoted example prompts it mentions.
+    """
+    texts = definition if isinstance(definition, list) else [definition]
+    examples = []
+    for text in texts:
+        examples.extend(s.strip() for s in re.split(r"(?<=[.?!])\s+", text) if s.strip())
+        examples.extend(q.strip() for q in re.findall(r"['\"]([^'\"]{3,})['\"]", text))
+    return examples
+
+
+def _chat_log_examples(log_dir: str) -> List[str]:
+    """
+    Collect the opening prompt of every logged conversation.
+    Logs are written by the teacher page, so they are general Q&A prompts.
+    """
+    examples = []
+    for path in sorted(glob.glob(os.path.join(log_dir, "*.json"))):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                messages = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Skipping chat log {path}: {e}")
+            continue
+        if messages and isinstance(messages[0].get("content"), str):
+            examples.append(messages[0]["content"].strip())
+    return [e for e in examples if e]
+
+
+def build_training_set(log_dir: str = CHAT_LOG_DIR) -> Tuple[List[str], List[str]]:
+    """
+    Build (texts, labels) from JOB_DEFINITION, TOOL_DEFINITION and the chat logs.
+    """
+    texts, labels = [], []
+    for job, definition in JOB_DEFINITION.items():
+        for example in _definition_examples(definition):
+            texts.append(example)
+            labels.append(job)
+    for tool, examples in TOOL_DEFINITION.items():
+        texts.extend(examples)
+        labels.extend([tool] * len(examples))
+    for example in _chat_log_examples(log_dir):
+        texts.append(example)
+        labels.append("ASK_QUESTION")
+    return texts, labels
+
+
+class IntentRouter:
+    """
+    Local TF-IDF + logistic regression classifier that picks a tool or job
+    for a prompt without an LLM round-trip.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, tool_threshold: float = TOOL_THRESHOLD,
+                 log_dir: str = CHAT_LOG_DIR):
+        self.threshold = threshold
+        self.tool_threshold = tool_threshold
+        texts, labels = build_training_set(log_dir)
+        # Character n-grams cope with typos and CJK text, word n-grams with phrasing.
+        vectorizers = [
+            TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True),
+            TfidfVectorizer(analyzer="word", ngram_range=(1, 2), sublinear_tf=True),
+        ]
+        features = hstack([v.fit_transform(texts) for v in vectorizers]).tocsr()
+        classifier = LogisticRegression(C=10.0, max_iter=1000)
+        classifier.fit(features, labels)
+        self.classes = [str(c) for c in classifier.classes_]
+
+        # sklearn's per-call input validation costs more than the maths for a
+        # single short prompt, so keep only what scoring needs.
+        self._weights = classifier.coef_.T.copy()
+        self._bias = classifier.intercept_.copy()
+        self._analyzers = []
+        offset = 0
+        for v in vectorizers:
+            self._analyzers.append((v.build_analyzer(), v.vocabulary_, v.idf_, offset))
+            offset += len(v.vocabulary_)
+
+    def predict_proba(self, prompt: str) -> np.ndarray:
+        """
+        Class probabilities for a single prompt, in the order of self.classes.
+        Equivalent to TfidfVectorizer.transform + LogisticRegression.predict_proba.
+        """
+        scores = self._bias.copy()
+        for analyzer, vocabulary, idf, offset in self._analyzers:
+            indices, values = [], []
+            for token, count in Counter(analyzer(prompt)).items():
+                column = vocabulary.get(token)
+                if column is not None:
+                    indices.append(column + offset)
+                    values.append((1 + math.log(count)) * idf[column])
+            if indices:
+                values = np.asarray(values)
+                scores += (values / np.linalg.norm(values)) @ self._weights[indices]
+        exp = np.exp(scores - scores.max())
+        return exp / exp.sum()
+
+    def route(self, prompt: str) -> Intent:
+        """
+        Classify a prompt. Returns an Intent whose label is None when the
+        confidence is below the threshold (tool_threshold for tool labels),
+        meaning the LLM should handle it.
+        """
+        start = time.perf_counter()
+        stripped = prompt.strip()
+        for prefix, job in PREFIX_JOBS.items():
+            if stripped.startswith(prefix):
+                return Intent(job, 1.0, "job", (time.perf_counter() - start) * 1000)
+
+        probabilities = self.predict_proba(stripped)
+        best = probabilities.argmax()
+        label, confidence = self.classes[best], float(probabilities[best])
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        kind = "tool" if label in TOOL_DEFINITION else "job"
+        if confidence < (self.tool_threshold if kind == "tool" else self.threshold):
+            return Intent(None, confidence, "llm", elapsed_ms)
+        return Intent(label, confidence, kind, elapsed_ms)
+
+
+def canned_response(intent: Intent, lang_setting: str = "English") -> Optional[str]:
+    """
+    Return the canned reply for an intent that needs no LLM call, if any.
+    """
+    replies: Optional[Dict[str, str]] = CANNED_RESPONSES.get(intent.label or "")
+    if not replies:
+        return None
+    return replies.get(lang_setting, replies["English"])
+
+
+_router: Optional[IntentRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_intent_router() -> IntentRouter:
+    """
+    Return the process-wide IntentRouter, training it on first use.
+    """
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = IntentRouter()
+    return _router
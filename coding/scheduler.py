@@ -0,0 +1,345 @@
+import contextvars
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+
+from coding.tracing import span
+
+INTERACTIVE = 0  # a user is waiting on the answer
+BACKGROUND = 1   # summaries, prefetching, benchmarks
+
+# Ceiling on queued requests per priority; beyond this callers get SchedulerBusy.
+DEFAULT_MAX_QUEUE = {INTERACTIVE: 64, BACKGROUND: 256}
+# Longest a request may wait for quota before giving up; well below the
+# ModelRouter timeouts (30 s for a story) so a busy route still fails over in time.
+DEFAULT_MAX_WAIT = 10.0
+# Seconds to stop admitting requests after a 429 without Retry-After.
+DEFAULT_RATE_LIMIT_PAUSE = 5.0
+# Output tokens assumed when a request does not set max_tokens.
+DEFAULT_OUTPUT_TOKENS = 512
+
+
+class RateLimit(NamedTuple):
+    requests_per_minute: float
+    tokens_per_minute: float
+
+
+# Per-model quotas (https://ai.google.dev/gemini-api/docs/rate-limits,
+# https://platform.openai.com/docs/guides/rate-limits). Override with the
+# LLM_RATE_LIMITS env var, e.g. '{"gpt-4o-mini": [5000, 2000000]}'.
+DEFAULT_RATE_LIMITS = {
+    "gemini-2.0-flash": RateLimit(2000, 4_000_000),
+    "gemini-2.0-flash-lite": RateLimit(4000, 4_000_000),
+    "gpt-4o-mini": RateLimit(500, 200_000),
+}
+FALLBACK_RATE_LIMIT = RateLimit(60, 100_000)
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+_session_tag: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("llm_session_tag", default=None)
+
+
+class SchedulerBusy(Exception):
+    """
+    Raised when the queue is full or quota does not free up in time.
+    ScheduledTransport answers it with a local 429 marked x-should-retry:
+    false, so the SDK gives up at once (it would retry a transport error
+    twice, waiting max_wait each time) and the ModelRouter fails over.
+    """
+
+    def __init__(self, message: str, retry_after: float = DEFAULT_RATE_LIMIT_PAUSE):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """
+    Run LLM calls made inside the block at the given priority.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@contextmanager
+def llm_session(tag: str):
+    """
+    Tag LLM calls made inside the block so the UI can ask whether they are queued.
+    """
+    token = _session_tag.set(tag)
+    try:
+        yield
+    finally:
+        _session_tag.reset(token)
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `per_minute / 60` per second.
+    Not thread-safe on its own; LLMScheduler guards it with its lock.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """
+        Seconds until `amount` tokens are available (0 if available now).
+        Requests larger than the bucket only wait for it to be full.
+        """
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+    def drain(self, seconds: float) -> None:
+        """
+        Empty the bucket so nothing is admitted for roughly `seconds`.
+        """
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "key", "tokens", "tag")
+
+    def __init__(self, priority: int, seq: int, key: str, tokens: int, tag: Optional[str]):
+        self.priority, self.seq, self.key, self.tokens, self.tag = priority, seq, key, tokens, tag
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control for LLM requests: token buckets for
+    requests and tokens per minute per (API key, model), and a priority
+    queue per key so interactive requests go ahead of background ones.
+    """
+
+    def __init__(self, rate_limits: Optional[Dict[str, RateLimit]] = None,
+                 max_queue: Optional[Dict[int, int]] = None, max_wait: float = DEFAULT_MAX_WAIT):
+        self.rate_limits = dict(DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits)
+        self.max_queue = dict(DEFAULT_MAX_QUEUE if max_queue is None else max_queue)
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+        self._queues: Dict[str, List[_Waiter]] = {}
+        self._seq = itertools.count()
+        self._stats = {"admitted": 0, "rejected": 0, "rate_limited": 0, "wait_seconds": 0.0}
+
+    def _buckets_for(self, key: str, model: str) -> Tuple[TokenBucket, TokenBucket]:
+        if key not in self._buckets:
+            limit = self.rate_limits.get(model, FALLBACK_RATE_LIMIT)
+            self._buckets[key] = (TokenBucket(limit.requests_per_minute), TokenBucket(limit.tokens_per_minute))
+        return self._buckets[key]
+
+    def _queued(self, priority: int) -> int:
+        return sum(1 for queue in self._queues.values() for w in queue if w.priority == priority)
+
+    def acquire(self, key: str, model: str, tokens: int) -> None:
+        """
+        Block until a request of `tokens` estimated tokens may be sent.
+
+        Raises:
+            SchedulerBusy: the queue for this priority is full, or quota did
+                not free up within max_wait seconds.
+        """
+        priority = _priority.get()
+        start = time.monotonic()
+        with self._cond:
+            if self._queued(priority) >= self.max_queue.get(priority, 0):
+                self._stats["rejected"] += 1
+                raise SchedulerBusy(f"LLM queue full ({self._queued(priority)} waiting)")
+            requests, token_bucket = self._buckets_for(key, model)
+            waiter = _Waiter(priority, next(self._seq), key, tokens, _session_tag.get())
+            queue = self._queues.setdefault(key, [])
+            heapq.heappush(queue, waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if queue[0] is waiter:
+                        delay = max(requests.wait_time(1, now), token_bucket.wait_time(tokens, now))
+                        if delay == 0.0:
+                            requests.consume(1)
+                            token_bucket.consume(tokens)
+                            self._stats["admitted"] += 1
+                            self._stats["wait_seconds"] += now - start
+                            return
+                    else:
+                        delay = self.max_wait
+                    remaining = start + self.max_wait - now
+                    if remaining <= 0:
+                        self._stats["rejected"] += 1
+                        raise SchedulerBusy(f"Waited {self.max_wait}s for {model} quota", retry_after=delay)
+                    self._cond.wait(min(delay, remaining))
+            finally:
+                if waiter in queue:
+                    queue.remove(waiter)
+                    heapq.heapify(queue)
+                self._cond.notify_all()
+
+    def settle(self, key: str, estimated: int, actual: Optional[int], pause: float = 0.0) -> None:
+        """
+        Correct the token bucket with the real usage. After a 429, pass the
+        provider's Retry-After as `pause` so queued requests wait it out
+        instead of piling on.
+        """
+        with self._cond:
+            buckets = self._buckets.get(key)
+            if buckets is None:
+                return
+            requests, token_bucket = buckets
+            if actual is not None:
+                token_bucket.adjust(actual - estimated)
+            if pause > 0:
+                self._stats["rate_limited"] += 1
+                requests.drain(pause)
+                token_bucket.drain(pause)
+            self._cond.notify_all()
+
+    def queued(self, tag: Optional[str] = None) -> int:
+        """
+        Number of requests waiting for quota, optionally only those tagged
+        with `tag` via llm_session(). Used by the UI to show "queued".
+        """
+        with self._cond:
+            return sum(1 for queue in self._queues.values() for w in queue if tag is None or w.tag == tag)
+
+    def status(self) -> Dict[str, object]:
+        with self._cond:
+            now = time.monotonic()
+            buckets = {}
+            for key, (requests, token_bucket) in self._buckets.items():
+                requests._refill(now)
+                token_bucket._refill(now)
+                buckets[key] = {"requests_available": round(requests.tokens, 1),
+                                "tokens_available": round(token_bucket.tokens),
+                                "queued": len(self._queues.get(key, []))}
+            return {**self._stats, "buckets": buckets}
+
+
+def _rate_limits_from_env() -> Dict[str, RateLimit]:
+    limits = dict(DEFAULT_RATE_LIMITS)
+    raw = os.getenv("LLM_RATE_LIMITS")
+    if raw:
+        try:
+            limits.update({model: RateLimit(*values) for model, values in json.loads(raw).items()})
+        except (ValueError, TypeError) as e:
+            print(f"Ignoring invalid LLM_RATE_LIMITS: {e}")
+    return limits
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """
+    Return the process-wide LLMScheduler.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(_rate_limits_from_env())
+    return _scheduler
+
+
+def _estimate_tokens(payload: dict, body_size: int) -> int:
+    output_tokens = payload.get("max_tokens") or payload.get("max_completion_tokens") or DEFAULT_OUTPUT_TOKENS
+    return body_size // 4 + int(output_tokens)
+
+
+class ScheduledTransport(httpx.BaseTransport):
+    """
+    httpx transport that admits each chat-completion request through the
+    LLMScheduler before handing it to the pooled transport underneath.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, scheduler: Optional[LLMScheduler] = None):
+        self.transport = transport
+        self.scheduler = scheduler
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST":
+            return self.transport.handle_request(request)
+        body = request.read()
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            payload = {}
+        model = payload.get("model")
+        if not model:
+            return self.transport.handle_request(request)
+
+        scheduler = self.scheduler or get_scheduler()
+        # Quotas are per API key and model; never keep the key itself.
+        auth = request.headers.get("authorization", "")
+        key = f"{hashlib.sha256(auth.encode()).hexdigest()[:12]}:{model}"
+        estimated = _estimate_tokens(payload, len(body))
+
+        with span(model, "llm_call", model=model, host=request.url.host) as llm_span:
+            queued_at = time.perf_counter()
+            try:
+                scheduler.acquire(key, model, estimated)
+            except SchedulerBusy as e:
+                llm_span.set(queue_wait_ms=(time.perf_counter() - queued_at) * 1000, status=429, busy=True)
+                return httpx.Response(
+                    429, request=request, json={"error": {"message": str(e), "type": "scheduler_busy"}},
+                    headers={"x-should-retry": "false", "retry-after": f"{e.retry_after:.1f}"})
+            sent_at = time.perf_counter()
+            response = self.transport.handle_request(request)
+            # Non-streaming calls: the first byte arrives with the headers.
+            llm_span.set(queue_wait_ms=(sent_at - queued_at) * 1000,
+                         ttft_ms=(time.perf_counter() - sent_at) * 1000,
+                         status=response.status_code)
+
+            usage = {}
+            if response.status_code == 200 and not payload.get("stream"):
+                # Buffer the (still encoded) body to read the real token usage,
+                # then hand the client an equivalent response over those bytes.
+                raw = b"".join(response.iter_raw())
+                response.close()
+                try:
+                    decoded = httpx.Response(200, headers=response.headers, content=raw).read()
+                    usage = json.loads(decoded).get("usage") or {}
+                except (ValueError, AttributeError, httpx.DecodingError):
+                    usage = {}
+                response = httpx.Response(response.status_code, headers=response.headers, content=raw,
+                                          request=request, extensions=response.extensions)
+            llm_span.set(input_tokens=usage.get("prompt_tokens"), output_tokens=usage.get("completion_tokens"),
+                         cached_tokens=(usage.get("prompt_tokens_details") or {}).get("cached_tokens"))
+
+        pause = 0.0
+        if response.status_code == 429:
+            try:
+                pause = float(response.headers.get("retry-after", DEFAULT_RATE_LIMIT_PAUSE))
+            except ValueError:
+                pause = DEFAULT_RATE_LIMIT_PAUSE
+        scheduler.settle(key, estimated, usage.get("total_tokens"), pause)
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
@@ -0,0 +1,137 @@
+"""
+Headless agent service: the conversation pipelines over HTTP.
+
+    python -m coding.service --port 8600 --workers 4
+
+Each worker is a separate process with its own model router, scheduler and
+HTTP pools; uvicorn shares the listening socket between them, so the
+kernel balances connections. Summaries and extracted tables are shared
+through the SQLite cache (coding.kvcache). Point the Streamlit app at the
+service with AGENT_SERVICE_URL=http://127.0.0.1:8600.
+
+    POST /v1/pipelines/{story|tools|teacher|pdf_summary|wordcloud|market_chart}
+         {"prompt": "...", "lang_setting": "English", "user_name": "...", "session": "..."}
+    GET  /healthz, /v1/status, /metrics
+"""
+import argparse
+import os
+import time
+from contextlib import asynccontextmanager
+
+import anyio
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from coding.executor import close_tool_pool, tool_pool_status
+from coding.http_clients import pool_metrics
+from coding.llm import AllRoutesFailed, get_model_router
+from coding.pipelines import PIPELINES
+from coding.router import get_intent_router
+from coding.scheduler import get_scheduler, llm_session
+from coding.termination import termination_stats
+from coding.tracing import get_tracer, span, trace_session
+
+# Seconds uvicorn waits for a worker to answer its health check; importing
+# ag2, pandas and the intent model can hold a small host longer than the 5 s default.
+SERVICE_HEALTHCHECK_TIMEOUT = int(os.getenv("SERVICE_HEALTHCHECK_TIMEOUT", "60"))
+# Pipelines running at once per worker; more requests wait for a slot.
+SERVICE_MAX_CONCURRENCY = int(os.getenv("SERVICE_MAX_CONCURRENCY", "16"))
+
+_limiter = anyio.CapacityLimiter(SERVICE_MAX_CONCURRENCY)
+
+
+def _run(name: str, body: dict) -> dict:
+    session = str(body.get("session") or "")
+    with trace_session(session or None), llm_session(session or None), span(name, "pipeline"):
+        return PIPELINES[name](str(body["prompt"]), str(body.get("lang_setting") or "English"),
+                               str(body.get("user_name") or ""))
+
+
+def _spans(body: dict, started: float) -> list:
+    """
+    The request's spans, returned so the caller's trace panel can show them.
+    """
+    session = str(body.get("session") or "")
+    if not session:
+        return []
+    # Agent turns are timed from the previous message, so filter on when spans ended.
+    return [s.to_dict() for s in get_tracer().spans(session)
+            if s.duration_ms is not None and s.start + s.duration_ms / 1000 >= started]
+
+
+async def run_pipeline(request: Request) -> JSONResponse:
+    name = request.path_params["name"]
+    if name not in PIPELINES:
+        return JSONResponse({"error": f"Unknown pipeline '{name}'"}, status_code=404)
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    if not isinstance(body, dict) or not isinstance(body.get("prompt"), str):
+        return JSONResponse({"error": "Expected a JSON object with a 'prompt' string"}, status_code=400)
+    # ag2 conversations are blocking; run them on worker threads.
+    started = time.time()
+    try:
+        result = await anyio.to_thread.run_sync(_run, name, body, limiter=_limiter)
+    except AllRoutesFailed as e:
+        return JSONResponse({"error": str(e), "spans": _spans(body, started)}, status_code=503)
+    except Exception as e:  # tool failures, unreadable PDFs, bugs
+        return JSONResponse({"error": f"{type(e).__name__}: {e}", "spans": _spans(body, started)}, status_code=500)
+    return JSONResponse({**result, "spans": _spans(body, started)})
+
+
+async def healthz(request: Request) -> PlainTextResponse:
+    return PlainTextResponse("ok")
+
+
+async def status(request: Request) -> JSONResponse:
+    return JSONResponse({
+        "pid": os.getpid(),
+        "busy": SERVICE_MAX_CONCURRENCY - _limiter.available_tokens,
+        "routes": get_model_router().snapshot(),
+        "scheduler": get_scheduler().status(),
+        "http_pools": pool_metrics(),
+        "tool_pool": tool_pool_status(),
+        "termination": termination_stats(),
+    })
+
+
+async def metrics(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(get_tracer().prometheus_text(), media_type="text/plain; version=0.0.4")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load the intent model and providers before the first request arrives.
+    await anyio.to_thread.run_sync(get_intent_router)
+    get_model_router()
+    # Tool workers start on the first process tool call: spawning them here
+    # competes with uvicorn's worker health checks on small hosts.
+    yield
+    close_tool_pool()
+
+
+app = Starlette(routes=[
+    Route("/v1/pipelines/{name}", run_pipeline, methods=["POST"]),
+    Route("/v1/status", status),
+    Route("/healthz", healthz),
+    Route("/metrics", metrics),
+], lifespan=lifespan)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    uvicorn.run("coding.service:app", host=args.host, port=args.port, workers=args.workers, log_level="info",
+                timeout_worker_healthcheck=SERVICE_HEALTHCHECK_TIMEOUT)
+
+
+if __name__ == "__main__":
+    main()
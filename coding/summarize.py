@@ -0,0 +1,308 @@
+import contextvars
+import functools
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import pandas as pd
+
+from coding.kvcache import KVCache, get_cache
+from coding.prompts import CHAT_SUMMARY_PROMPT, CHUNK_SUMMARY_PROMPT, REDUCE_SUMMARY_PROMPT, PromptTemplate, count_tokens
+from coding.scheduler import BACKGROUND, llm_priority
+from coding.tracing import span
+
+# Chunk summaries (and reduce steps) running at once per document. Each one
+# holds a ModelRouter thread (two when hedged), so get_summarizer() caps this
+# at a quarter of LLM_ROUTER_THREADS to leave room for interactive chats.
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+# Pages are packed into chunks of MIN_CHUNK_TOKENS..MAX_CHUNK_TOKENS tokens.
+MIN_CHUNK_TOKENS = 1000
+MAX_CHUNK_TOKENS = 3000
+# Summaries combined per reduce call.
+REDUCE_FAN_IN = 6
+# Sentences kept by the local extractive chat summary.
+CHAT_SUMMARY_SENTENCES = 5
+
+# Sentence ends, including CJK punctuation, and the words sentences are scored by.
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s+|(?<=[。！？])|\n+")
+_WORD = re.compile(r"[^\W\d_]{3,}|[\u4e00-\u9fff]")
+_STOP_WORDS = frozenset(
+    "the and for are but not you your with this that from have has had was were will would can could "
+    "should there their they them then than what when where which who whom why how all any each also "
+    "into about after before over under again very just more most some such only own same our out its "
+    "it's his her him she let here please thank thanks".split()
+)
+
+
+class Chunk(NamedTuple):
+    first_page: int
+    last_page: int
+    text: str
+
+    @property
+    def pages(self) -> str:
+        return str(self.first_page) if self.first_page == self.last_page else f"{self.first_page}-{self.last_page}"
+
+
+class SummaryResult(NamedTuple):
+    summary: str
+    chunks: int
+    cached: int
+    llm_calls: int
+    rounds: int
+
+
+def chunk_pages(pages: pd.DataFrame, min_tokens: int = MIN_CHUNK_TOKENS,
+                max_tokens: int = MAX_CHUNK_TOKENS) -> List[Chunk]:
+    """
+    Pack consecutive pages (extract_text_by_page output) into chunks.
+
+    A chunk ends after a page whose content hash picks it as a boundary
+    once min_tokens is reached, or when the next page would exceed
+    max_tokens. Boundaries depend on page content rather than position, so
+    editing one page changes its own chunk and leaves the others (and their
+    cached summaries) alone. Pages longer than max_tokens are split.
+    """
+    chunks: List[Chunk] = []
+    texts: List[str] = []
+    first = tokens = 0
+
+    def flush(last: int):
+        nonlocal texts, tokens
+        if texts:
+            chunks.append(Chunk(first, last, "\n\n".join(texts)))
+        texts, tokens = [], 0
+
+    for page, content in zip(pages["page"], pages["content"]):
+        content = (content or "").strip()
+        if not content:
+            continue
+        page_tokens = count_tokens(content)
+        if page_tokens > max_tokens:
+            flush(page - 1)
+            step = max(1, len(content) * max_tokens // page_tokens)
+            for start in range(0, len(content), step):
+                chunks.append(Chunk(page, page, content[start:start + step]))
+            continue
+        if tokens + page_tokens > max_tokens:
+            flush(page - 1)
+        if not texts:
+            first = page
+        texts.append(content)
+        tokens += page_tokens
+        if tokens >= min_tokens and hashlib.sha256(content.encode()).digest()[0] % 4 == 0:
+            flush(page)
+    flush(int(pages["page"].iloc[-1]) if len(pages) else 0)
+    return chunks
+
+
+class SummaryCache:
+    """
+    Summaries keyed by a hash of the prompt prefix, language and input text,
+    kept in memory and in the shared SQLite cache (see coding.kvcache) so
+    they survive restarts and are shared by every session and process.
+    """
+
+    NAMESPACE = "summary"
+
+    def __init__(self, store: Optional[KVCache] = None):
+        self.store = store
+        self._memory: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(template: PromptTemplate, lang_setting: str, text: str) -> str:
+        return hashlib.sha256(f"{template.prefix}\0{lang_setting}\0{text}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+        summary = (self.store or get_cache()).get(self.NAMESPACE, key)
+        if summary is not None:
+            with self._lock:
+                self._memory[key] = summary
+        return summary
+
+    def put(self, key: str, summary: str) -> None:
+        with self._lock:
+            self._memory[key] = summary
+        (self.store or get_cache()).put(self.NAMESPACE, key, summary)
+
+
+def llm_summarize(prompt: str) -> str:
+    """
+    One summarization call on the cheapest capable model, with failover.
+    """
+    from autogen import ConversableAgent
+    from autogen.code_utils import content_str
+
+    from coding.llm import SIMPLE, get_model_router
+
+    def task(route):
+        with route.llm_config:
+            agent = ConversableAgent(name="summarizer", human_input_mode="NEVER",
+                                     system_message="You write faithful, concise summaries.")
+        reply = agent.generate_reply(messages=[{"role": "user", "content": prompt}])
+        if isinstance(reply, dict):
+            reply = reply.get("content")
+        return content_str(reply).strip()
+
+    return get_model_router().run(task, complexity=SIMPLE, timeout=60)
+
+
+class DocumentSummarizer:
+    """
+    Map-reduce summarization: chunk summaries run concurrently (at most
+    `concurrency` at a time), then are combined REDUCE_FAN_IN at a time,
+    round after round, until one summary is left. Every step is cached by
+    content hash, so re-summarizing an edited document only redoes the
+    changed chunks and the reduce steps above them. The LLM calls run at
+    BACKGROUND priority so a long document does not hold up chat turns.
+    """
+
+    def __init__(self, summarize: Callable[[str], str] = llm_summarize, cache: Optional[SummaryCache] = None,
+                 concurrency: int = SUMMARY_CONCURRENCY, fan_in: int = REDUCE_FAN_IN):
+        self.summarize = summarize
+        self.cache = cache or SummaryCache()
+        self.concurrency = max(1, concurrency)
+        self.fan_in = max(2, fan_in)
+
+    def _run(self, template: PromptTemplate, lang_setting: str, text: str, **variables: str) -> tuple:
+        """
+        Summarize one input through the cache; returns (summary, was_cached).
+        """
+        key = self.cache.key(template, lang_setting, text)
+        with span(template.name, "summary", **variables) as summary_span:
+            summary = self.cache.get(key)
+            summary_span.set(cached=summary is not None)
+            if summary is not None:
+                return summary, True
+            summary = self.summarize(template.render(lang_setting=lang_setting, text=text, **variables))
+            # An empty reply is a failed call; don't serve it from the cache next time.
+            if summary:
+                self.cache.put(key, summary)
+            return summary, False
+
+    def summarize_pages(self, pages: pd.DataFrame, lang_setting: str = "English") -> SummaryResult:
+        """
+        Summarize extract_text_by_page output.
+        """
+        chunks = chunk_pages(pages)
+        if not chunks:
+            return SummaryResult("", 0, 0, 0, 0)
+        cached = calls = rounds = 0
+
+        with llm_priority(BACKGROUND), \
+                ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="summarize") as executor:
+            def run_round(template: PromptTemplate, jobs: List[tuple]) -> List[str]:
+                nonlocal cached, calls, rounds
+                # Each job carries the caller's context (trace, LLM priority, session tag).
+                futures = [executor.submit(contextvars.copy_context().run, self._run, template, lang_setting,
+                                           text, **variables) for text, variables in jobs]
+                results = [future.result() for future in futures]
+                rounds += 1
+                cached += sum(1 for _, hit in results if hit)
+                calls += sum(1 for _, hit in results if not hit)
+                return [summary for summary, _ in results]
+
+            summaries = run_round(CHUNK_SUMMARY_PROMPT, [(chunk.text, {"pages": chunk.pages}) for chunk in chunks])
+            while len(summaries) > 1:
+                groups = [summaries[i:i + self.fan_in] for i in range(0, len(summaries), self.fan_in)]
+                summaries = run_round(REDUCE_SUMMARY_PROMPT,
+                                      [("\n\n".join(f"- {s}" for s in group), {}) for group in groups])
+        return SummaryResult(summaries[0], len(chunks), cached, calls, rounds)
+
+
+_summarizer: Optional[DocumentSummarizer] = None
+_summarizer_lock = threading.Lock()
+
+
+def get_summarizer() -> DocumentSummarizer:
+    """
+    Return the process-wide DocumentSummarizer so all sessions share its cache.
+    """
+    global _summarizer
+    if _summarizer is None:
+        with _summarizer_lock:
+            if _summarizer is None:
+                from coding.llm import LLM_ROUTER_THREADS
+
+                _summarizer = DocumentSummarizer(concurrency=min(SUMMARY_CONCURRENCY, LLM_ROUTER_THREADS // 4))
+    return _summarizer
+
+
+@functools.lru_cache(maxsize=256)
+def extractive_summary(text: str, max_sentences: int = CHAT_SUMMARY_SENTENCES) -> str:
+    """
+    Pick the `max_sentences` most representative sentences of `text`, in
+    their original order. Sentences are scored by how frequent their words
+    are in the whole text (stop words excluded), dampened by length. Runs
+    locally in milliseconds; results are memoized per text.
+    """
+    sentences = [s.strip() for s in _SENTENCE_END.split(text) if s and s.strip()]
+    if len(sentences) <= max_sentences:
+        return " ".join(sentences)
+    words = [[w for w in _WORD.findall(s.lower()) if w not in _STOP_WORDS] for s in sentences]
+    frequency = Counter(w for sentence in words for w in sentence)
+    scores = [sum(frequency[w] for w in sentence) / math.sqrt(len(sentence)) if sentence else 0.0
+              for sentence in words]
+    keep = sorted(sorted(range(len(sentences)), key=lambda i: -scores[i])[:max_sentences])
+    return " ".join(sentences[i] for i in keep)
+
+
+def chat_transcript(messages: List[Dict[str, Any]]) -> str:
+    """
+    The text of a chat history as "name: content" lines, without tool
+    results, tool calls or stop markers.
+    """
+    from coding.termination import strip_stop_signal
+
+    lines = []
+    for message in messages:
+        content = message.get("content")
+        if message.get("role") == "tool" or not isinstance(content, str):
+            continue
+        content = strip_stop_signal(content)
+        if content:
+            lines.append(f"{message.get('name') or message.get('role', 'user')}: {content}")
+    return "\n".join(lines)
+
+
+def summarize_chat(messages: List[Dict[str, Any]], lang_setting: str = "English", use_llm: bool = False,
+                   cache: Optional[SummaryCache] = None) -> str:
+    """
+    Summarize a chat history on demand. The default is the local
+    extractive summary; use_llm=True asks a model instead (cached in the
+    shared summary cache, so each conversation is summarized at most once).
+    """
+    text = chat_transcript(messages)
+    if not text:
+        return ""
+    if not use_llm:
+        # Speakers' names would dominate the word counts.
+        return extractive_summary(re.sub(r"^[^:\n]+: ", "", text, flags=re.M))
+    cache = cache or SummaryCache()
+    key = cache.key(CHAT_SUMMARY_PROMPT, lang_setting, text)
+    with span(CHAT_SUMMARY_PROMPT.name, "summary") as summary_span:
+        summary = cache.get(key)
+        summary_span.set(cached=summary is not None)
+        if summary is None:
+            summary = llm_summarize(CHAT_SUMMARY_PROMPT.render(lang_setting=lang_setting, text=text))
+            if summary:
+                cache.put(key, summary)
+    return summary
+
+
+def local_summary_method(sender, recipient, summary_args: dict) -> str:
+    """
+    ag2 summary_method: the extractive summary of the chat between the two
+    agents, in place of "reflection_with_llm" (one more full-history LLM
+    call at the end of every chat, whose result the pages never read).
+    """
+    return summarize_chat(sender.chat_messages.get(recipient, []))
@@ -0,0 +1,224 @@
+"""
+Termination control for agent conversations.
+
+Agents used to stop only when a reply contained the exact marker their
+counterpart was listening for ("ALL DONE", "##ALL DONE##" or "ALL_DONE"),
+so a missed or misspelt marker ran the chat to its turn limit. A
+TerminationController is passed as `is_termination_msg` to every agent of
+a conversation and stops it on:
+
+  * a structured stop signal: a call to the finish_conversation tool, a
+    {"done": true} JSON marker, or any spelling of the done marker at the
+    end of a message;
+  * an exhausted turn, token or time budget, or the ModelRouter
+    abandoning the attempt the conversation runs in;
+  * a stall: consecutive messages that are empty or repeat what the same
+    agent already said (including identical tool calls).
+
+finish() records why the conversation stopped and how much of its turn
+and token budget was left unused, as a "termination" span and in
+termination_stats(). Unused budget is an upper bound on what stopping
+early saved, not a measurement: most chats would have ended well before
+their budget anyway.
+"""
+import difflib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, NamedTuple, Optional, Tuple
+
+from coding.executor import cancel_requested
+from coding.prompts import count_tokens
+from coding.tracing import record_span
+
+# The marker agents are told to end with; the other spellings are still accepted.
+DONE_MARKER = "ALL DONE"
+# Tool agents may call instead of writing the marker.
+FINISH_TOOL = "finish_conversation"
+# Default budgets per conversation; a turn is one message between the agents.
+TERMINATION_MAX_TURNS = int(os.getenv("TERMINATION_MAX_TURNS", "12"))
+TERMINATION_MAX_TOKENS = int(os.getenv("TERMINATION_MAX_TOKENS", "40000"))
+# Consecutive empty or repeated messages that count as a stall.
+STALL_TURNS = 2
+# Messages per agent compared against for repeats, and how similar counts as a repeat.
+REPEAT_WINDOW = 4
+REPEAT_SIMILARITY = 0.9
+
+# "ALL DONE", "ALL_DONE", "##ALL DONE##", optionally followed by punctuation, ending the message.
+_DONE_AT_END = re.compile(r"(?:#{1,2}\s*)?\bALL[ _]DONE\b(?:\s*#{1,2})?[\s.!。！]*$")
+_DONE_ANYWHERE = re.compile(r"(?:#{1,2}\s*)?\bALL[ _]DONE\b(?:\s*#{1,2})?")
+_DONE_JSON = re.compile(r'\{\s*"done"\s*:\s*true\s*\}')
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Any] = {"conversations": 0, "turns": 0, "tokens": 0, "unused_turns": 0, "unused_tokens": 0,
+                          "reasons": Counter()}
+
+
+class TerminationReport(NamedTuple):
+    reason: str          # finish_tool, json_marker, done_marker, turn_budget, token_budget, time_budget, cancelled, stalled, repeated, or "ended"
+    turns: int
+    tokens: int          # estimated tokens of all messages
+    seconds: float
+    unused_turns: int    # turn budget left when the conversation stopped
+    unused_tokens: int   # token budget left when the conversation stopped
+
+
+def strip_stop_signal(content: str) -> str:
+    """
+    Remove done markers and the JSON stop marker from a message for display.
+    """
+    return _DONE_JSON.sub("", _DONE_ANYWHERE.sub("", content)).strip()
+
+
+def stop_signal(message: Dict[str, Any]) -> Optional[str]:
+    """
+    Return the kind of stop signal a message carries, or None.
+    """
+    for call in message.get("tool_calls") or []:
+        if (call.get("function") or {}).get("name") == FINISH_TOOL:
+            return "finish_tool"
+    content = _text(message)
+    if _DONE_JSON.search(content):
+        return "json_marker"
+    if _DONE_AT_END.search(content):
+        return "done_marker"
+    return None
+
+
+def finish_conversation(summary: str = "") -> str:
+    """
+    Signal that the task is complete. The conversation ends when this call is sent.
+    """
+    return "Conversation finished."
+
+
+def register_finish_tool(caller, executor) -> None:
+    """
+    Offer `caller` the finish_conversation tool (executed by `executor`).
+    """
+    from autogen import register_function
+
+    register_function(finish_conversation, caller=caller, executor=executor, name=FINISH_TOOL,
+                      description="Call this once the task is complete to end the conversation.")
+
+
+def _text(message: Dict[str, Any]) -> str:
+    content = message.get("content")
+    if isinstance(content, list):  # multimodal content
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content if isinstance(content, str) else ""
+
+
+def _tool_signature(message: Dict[str, Any]) -> str:
+    calls = message.get("tool_calls") or []
+    return json.dumps([[(c.get("function") or {}).get("name"), (c.get("function") or {}).get("arguments")]
+                       for c in calls])
+
+
+class TerminationController:
+    """
+    Callable is_termination_msg shared by the agents of one conversation.
+
+    ag2 may check the same message several times; decisions are cached per
+    message so each one is counted once. Build a new controller for every
+    conversation (and every router attempt).
+    """
+
+    def __init__(self, name: str, max_turns: int = TERMINATION_MAX_TURNS, max_tokens: int = TERMINATION_MAX_TOKENS,
+                 max_seconds: Optional[float] = None, stall_turns: int = STALL_TURNS):
+        self.name = name
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.stall_turns = stall_turns
+        self.turns = 0
+        self.tokens = 0
+        self.reason: Optional[str] = None
+        self._start = time.monotonic()
+        self._unproductive = 0
+        self._recent: Dict[str, Deque[Tuple[str, str]]] = {}
+        self._seen: Dict[int, Tuple[Dict[str, Any], bool]] = {}
+        self._finished: Optional[TerminationReport] = None
+        self._lock = threading.Lock()
+
+    def __call__(self, message: Dict[str, Any]) -> bool:
+        with self._lock:
+            seen = self._seen.get(id(message))
+            if seen is not None and seen[0] is message:
+                return seen[1]
+            stop = self._check(message)
+            # Keep the message referenced so its id is not reused.
+            self._seen[id(message)] = (message, stop)
+            return stop
+
+    def _check(self, message: Dict[str, Any]) -> bool:
+        if self.reason is not None:
+            return True
+        self.turns += 1
+        text = _text(message)
+        calls = _tool_signature(message) if message.get("tool_calls") else ""
+        self.tokens += count_tokens(text) + count_tokens(calls)
+
+        self.reason = stop_signal(message) or self._budget_exhausted() or self._stalled(message, text, calls)
+        return self.reason is not None
+
+    def _budget_exhausted(self) -> Optional[str]:
+        if cancel_requested():
+            return "cancelled"
+        if self.turns >= self.max_turns:
+            return "turn_budget"
+        if self.tokens >= self.max_tokens:
+            return "token_budget"
+        if self.max_seconds is not None and time.monotonic() - self._start >= self.max_seconds:
+            return "time_budget"
+        return None
+
+    def _stalled(self, message: Dict[str, Any], text: str, calls: str) -> Optional[str]:
+        normalized = " ".join(text.lower().split())
+        recent = self._recent.setdefault(str(message.get("name") or message.get("role") or ""),
+                                         deque(maxlen=REPEAT_WINDOW))
+        repeated = bool(normalized or calls) and any(
+            calls == old_calls and (normalized == old or
+                                    difflib.SequenceMatcher(None, normalized[:2000], old[:2000]).ratio()
+                                    >= REPEAT_SIMILARITY)
+            for old, old_calls in recent
+        )
+        recent.append((normalized, calls))
+        if repeated or not (normalized or calls or message.get("role") == "tool"):
+            self._unproductive += 1
+        else:
+            self._unproductive = 0
+        if self._unproductive >= self.stall_turns:
+            return "repeated" if repeated else "stalled"
+        return None
+
+    def finish(self) -> TerminationReport:
+        """
+        Record how the conversation ended (once) and return the report.
+        """
+        with self._lock:
+            if self._finished is not None:
+                return self._finished
+            reason = self.reason or "ended"
+            report = TerminationReport(reason, self.turns, self.tokens, round(time.monotonic() - self._start, 3),
+                                       max(0, self.max_turns - self.turns), max(0, self.max_tokens - self.tokens))
+            self._finished = report
+
+        record_span(self.name, "termination", report.seconds * 1000, **report._asdict())
+        with _stats_lock:
+            _stats["conversations"] += 1
+            for field in ("turns", "tokens", "unused_turns", "unused_tokens"):
+                _stats[field] += getattr(report, field)
+            _stats["reasons"][reason] += 1
+        return report
+
+
+def termination_stats() -> Dict[str, Any]:
+    """
+    Totals over this process's conversations, including unused turn and token budget.
+    """
+    with _stats_lock:
+        return {**_stats, "reasons": dict(_stats["reasons"])}
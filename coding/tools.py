@@ -3,6 +3,13 @@ import re
 import pandas as pd
 import yfinance as yf
 import os
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from coding.tracing import span
+
+# Repository data directory (/workspaces/Gild-chatbot/data in the devcontainer).
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
 
 def load_pdf(pdf_path: str):
     """
@@ -25,33 +32,185 @@ def clean_text(text: str) -> str:
     text = re.sub(r'<[^>]+>', '', text)
     return text.strip()
 
+# A page is sent to find_tables() only if it has a run of at least this many
+# vertically adjacent same-width boxes (table cells/rows) ...
+MIN_STACKED_CELLS = 4
+# ... or a ruled grid: this many horizontal rules of equal width plus at
+# least two vertical rules ...
+MIN_HORIZONTAL_RULES = 3
+# ... or this many text rows split into three or more side-by-side blocks.
+MIN_COLUMNAR_ROWS = 3
+
+
+class PdfTable(NamedTuple):
+    """
+    A table found on a PDF page, with typed cells keyed by column name.
+    """
+    page: int
+    index: int
+    columns: List[str]
+    rows: List[Dict[str, Any]]
+
+    def describe(self) -> str:
+        """
+        One-line reference used in the page text instead of the full table.
+        """
+        return (f"[Table {self.index} on page {self.page}: {len(self.rows)} rows; "
+                f"columns: {', '.join(self.columns)}]")
+
+
+def looks_like_table_page(page) -> bool:
+    """
+    Cheap pre-pass deciding whether page.find_tables() is worth running,
+    from the page's vector drawings and text-block layout. It costs a few
+    milliseconds per page against tens of milliseconds for find_tables().
+    """
+    boxes, horizontal, vertical = [], [], 0
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] == "re":
+                rect = item[1]
+            elif item[0] == "l":
+                rect = pymupdf.Rect(item[1], item[2]).normalize()
+            else:
+                continue
+            if rect.height <= 2 and rect.width >= 20:
+                horizontal.append(rect)
+            elif rect.width <= 2 and rect.height >= 10:
+                vertical += 1
+            elif rect.width > 2 and 2 < rect.height < 100:
+                boxes.append(rect)
+
+    # Cell backgrounds/borders: same-x, same-width boxes stacked with (almost) no gap.
+    columns = defaultdict(list)
+    for rect in boxes:
+        columns[(round(rect.x0), round(rect.width))].append(rect)
+    for stack in columns.values():
+        stack.sort(key=lambda r: r.y0)
+        run = 1
+        for above, below in zip(stack, stack[1:]):
+            run = run + 1 if 0 <= below.y0 - above.y1 <= 3 else 1
+            if run >= MIN_STACKED_CELLS:
+                return True
+
+    rules = defaultdict(int)
+    for rect in horizontal:
+        rules[(round(rect.x0), round(rect.width))] += 1
+    if vertical >= 2 and max(rules.values(), default=0) >= MIN_HORIZONTAL_RULES:
+        return True
+
+    rows = defaultdict(int)
+    for block in page.get_text("blocks"):
+        rows[round(block[1])] += 1
+    return sum(1 for count in rows.values() if count >= 3) >= MIN_COLUMNAR_ROWS
+
+
+def _is_label(value) -> bool:
+    return isinstance(value, str) and len(value) <= 40 and not re.fullmatch(r"[\d.,%$\s-]+", value)
+
+
+def _typed(values: pd.Series) -> pd.Series:
+    numeric = pd.to_numeric(values.str.replace(",", "", regex=False), errors="coerce")
+    return numeric if numeric.notna().sum() == values.notna().sum() else values
+
+
+def _unique_names(names: List[str]) -> List[str]:
+    """
+    Suffix repeated column names (Name, Name_2, ...) so no column is lost in to_dict().
+    """
+    unique: List[str] = []
+    for name in names:
+        candidate, n = name, 1
+        while candidate in unique:
+            n += 1
+            candidate = f"{name}_{n}"
+        unique.append(candidate)
+    return unique
+
+
+def structure_table(df: pd.DataFrame, page: int, index: int) -> PdfTable:
+    """
+    Turn a find_tables() DataFrame into a PdfTable: drop empty rows and
+    columns, use the first row as header when pymupdf only produced
+    placeholder names (Col0, Col1...) and that row looks like labels, and
+    make all-numeric columns numeric.
+    """
+    df = df.astype("object").where(df.notna(), None)
+    df = df.apply(lambda col: col.map(lambda v: clean_text(v) or None if isinstance(v, str) else v))
+    df = df.dropna(how="all").dropna(axis=1, how="all")
+    if all(re.fullmatch(r"Col\d+", str(c)) for c in df.columns):
+        # apply() may have turned the None placeholders back into NaN.
+        header = [None if pd.isna(v) else v for v in df.iloc[0]] if len(df) > 1 else []
+        if header and all(_is_label(v) for v in header if v is not None):
+            df = df.iloc[1:].dropna(how="all")
+        else:
+            header = [None] * len(df.columns)
+        df.columns = _unique_names([name or f"column_{i + 1}" for i, name in enumerate(header)])
+    df = df.apply(lambda col: _typed(col.astype("string")) if col.map(lambda v: isinstance(v, str)).any() else col)
+    rows = [{k: (None if pd.isna(v) else v.item() if hasattr(v, "item") else v) for k, v in row.items()}
+            for row in df.to_dict("records")]
+    return PdfTable(page, index, [str(c) for c in df.columns], rows)
+
+
+def query_tables(tables: List[PdfTable], page: Optional[int] = None,
+                 column: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Select table rows by page and/or column (case-insensitive substring).
+    Each result keeps its page and table index so the answer can cite it.
+    """
+    results = []
+    for table in tables:
+        if page is not None and table.page != page:
+            continue
+        columns = [c for c in table.columns if column is None or column.lower() in c.lower()]
+        if not columns:
+            continue
+        for row in table.rows:
+            values = {c: row.get(c) for c in columns if row.get(c) is not None}
+            if values:
+                results.append({"page": table.page, "table": table.index, **values})
+    return results
+
+
 def extract_text_by_page(doc, max_pages: int = 40) -> pd.DataFrame:
     """
-    Extract cleaned text (and tables) from each page of the PDF.
-    
+    Extract cleaned text from each page of the PDF. Tables are detected only
+    on pages that look_like_table_page(); the page text gets a one-line
+    reference to each table (its cells are already in the text), and the
+    tables themselves are kept as PdfTable records.
+
     Returns:
-        pd.DataFrame with 'page' and 'content' columns.
+        pd.DataFrame with 'page' and 'content' columns; the PdfTable list is
+        in df.attrs["tables"] (see query_tables).
     """
     results = []
+    tables: List[PdfTable] = []
     total_pages = min(len(doc), max_pages)
 
     for page_number in range(total_pages):
         try:
-            page = doc[page_number]
-            text = clean_text(page.get_text())
+            with span("extract_text_by_page", "pdf_page", page=page_number + 1) as page_span:
+                page = doc[page_number]
+                text = clean_text(page.get_text())
 
-            # Extract tables and append to text
-            tables = page.find_tables()
-            for table in tables:
-                df = table.to_pandas()
-                text += "\nTable:\n" + df.to_string() + "\n"
+                found = []
+                candidate = looks_like_table_page(page)
+                if candidate:
+                    for table in page.find_tables():
+                        found.append(structure_table(table.to_pandas(), page_number + 1, len(found) + 1))
+                for table in found:
+                    text += "\n" + table.describe()
+                tables.extend(found)
+                page_span.set(chars=len(text), table_candidate=candidate, tables=len(found))
 
             results.append({"page": page_number + 1, "content": text})
 
         except Exception as e:
             print(f"Error processing page {page_number}: {e}")
 
-    return pd.DataFrame(results)
+    df = pd.DataFrame(results)
+    df.attrs["tables"] = tables
+    return df
 
 
 
@@ -82,7 +241,11 @@ def fetch_market_data(start_date="2022-01-01", end_date=None, interval="1mo"):
         for ticker in tickers:
             print(f"Fetching {ticker} from {sector}...")
             try:
-                data = yf.download(ticker, start=start_date, end=end_date, interval=interval, progress=False)
+                with span("yf.download", "fetch", ticker=ticker, sector=sector):
+                    data = yf.download(ticker, start=start_date, end=end_date, interval=interval, progress=False)
+                if isinstance(data.columns, pd.MultiIndex):
+                    # yfinance returns (Price, Ticker) columns; keep one flat row per date.
+                    data.columns = data.columns.get_level_values(0)
                 data.reset_index(inplace=True)
                 data["Ticker"] = ticker
                 data["Sector"] = sector
@@ -96,9 +259,66 @@ def fetch_market_data(start_date="2022-01-01", end_date=None, interval="1mo"):
     df = pd.concat(all_data, ignore_index=True)
     
     # Save to CSV
-    save_dir = "/workspaces/Gild-chatbot/data"
-    os.makedirs(save_dir, exist_ok=True)
-    csv_path = os.path.join(save_dir, "market_data.csv")
+    os.makedirs(DATA_DIR, exist_ok=True)
+    csv_path = os.path.join(DATA_DIR, "market_data.csv")
     df.to_csv(csv_path, index=False)
 
-    return df
\ No newline at end of file
+    return df
+
+MARKET_DATA_PATH = os.path.join(DATA_DIR, "market_data.csv")
+PRICE_FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+
+_market_data_cache = {}
+
+
+def market_data_version(csv_path: str = MARKET_DATA_PATH) -> str:
+    """
+    Identifies the current contents of the market data file (changes when
+    fetch_market_data rewrites it); "" if there is no file.
+    """
+    try:
+        stat = os.stat(csv_path)
+    except OSError:
+        return ""
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def load_market_data(csv_path: str = MARKET_DATA_PATH) -> pd.DataFrame:
+    """
+    Load the market data CSV as one row per (Date, Ticker) with columns
+    Date, Ticker, Sector, Open, High, Low, Close, Volume, sorted by ticker
+    and date. Cached until the file changes.
+
+    Older files were written from yfinance's (Price, Ticker) columns, which
+    gives two header rows and a separate block of price columns per ticker;
+    both layouts are accepted.
+    """
+    version = market_data_version(csv_path)
+    cached = _market_data_cache.get(csv_path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with open(csv_path, "r", encoding="utf-8") as f:
+        f.readline()
+        second = f.readline()
+    if second.startswith(","):
+        raw = pd.read_csv(csv_path, header=[0, 1])
+        tickers = raw[[c for c in raw.columns if c[0] == "Ticker"][0]]
+        rows = pd.RangeIndex(len(raw)).to_numpy()
+        df = pd.DataFrame({
+            "Date": raw.iloc[:, 0],
+            "Ticker": tickers,
+            "Sector": raw[[c for c in raw.columns if c[0] == "Sector"][0]],
+        })
+        for field in PRICE_FIELDS:
+            # Each row's value sits in the column block of its own ticker.
+            block = raw[field]
+            df[field] = block.to_numpy(dtype=float)[rows, block.columns.get_indexer(tickers)]
+    else:
+        df = pd.read_csv(csv_path)
+        df = df[["Date", "Ticker", "Sector"] + [f for f in PRICE_FIELDS if f in df.columns]]
+
+    df["Date"] = pd.to_datetime(df["Date"])
+    df = df.dropna(subset=["Close"]).sort_values(["Ticker", "Date"]).reset_index(drop=True)
+    _market_data_cache[csv_path] = (version, df)
+    return df
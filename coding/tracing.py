@@ -0,0 +1,315 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+# JSONL file every finished span is appended to; set TRACE_FILE="" to disable.
+# Anchored to the repository so every Streamlit and agent-service process shares it.
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                  "traces", "spans.jsonl"))
+# Set to serve Prometheus text metrics on http://127.0.0.1:<port>/metrics.
+TRACE_METRICS_PORT = os.getenv("TRACE_METRICS_PORT")
+# The trace file is renamed to <TRACE_FILE>.1 (replacing the previous one) once it grows past this.
+TRACE_FILE_MAX_MB = float(os.getenv("TRACE_FILE_MAX_MB", "100"))
+# Spans kept in memory per trace (browser session) for the debug panel.
+MAX_SPANS_PER_TRACE = 500
+# Traces kept in memory; the least recently updated one is dropped first.
+MAX_TRACES = int(os.getenv("TRACE_MAX_TRACES", "1000"))
+# Histogram buckets (milliseconds) for span durations.
+DURATION_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    One timed operation: a rerun, agent turn, LLM call, tool call or PDF page.
+    """
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start", "duration_ms", "attributes")
+
+    def __init__(self, name: str, kind: str, trace_id: Optional[str], parent_id: Optional[int],
+                 attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        # Random, not a counter: several processes append to the same trace file.
+        self.span_id = int.from_bytes(os.urandom(8), "big")
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration_ms: Optional[float] = None
+        self.attributes = attributes
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "name": self.name, "kind": self.kind, "start": self.start,
+            "duration_ms": self.duration_ms, **self.attributes,
+        }
+
+
+class Tracer:
+    """
+    Collects finished spans: keeps recent ones per trace in memory, appends
+    them to a JSONL file, and aggregates duration histograms and token
+    counters for Prometheus.
+    """
+
+    def __init__(self, trace_file: Optional[str] = TRACE_FILE):
+        self.trace_file = trace_file or None
+        self._lock = threading.Lock()
+        self._traces: "OrderedDict[str, Deque[Span]]" = OrderedDict()
+        self._histograms: Dict[tuple, List[float]] = {}
+        self._tokens: Dict[tuple, int] = defaultdict(int)
+        self._file = None
+
+    def record(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            if span.trace_id:
+                self._trace(span.trace_id).append(span)
+            key = (span.kind, span.name)
+            histogram = self._histograms.setdefault(key, [0] * len(DURATION_BUCKETS_MS) + [0, 0.0])
+            for i, bound in enumerate(DURATION_BUCKETS_MS):
+                if span.duration_ms <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += span.duration_ms
+            model = span.attributes.get("model")
+            for direction in ("input_tokens", "output_tokens"):
+                if model and span.attributes.get(direction):
+                    self._tokens[(model, direction)] += int(span.attributes[direction])
+            if self.trace_file:
+                try:
+                    if self._file is None:
+                        os.makedirs(os.path.dirname(self.trace_file) or ".", exist_ok=True)
+                        self._file = open(self.trace_file, "a", encoding="utf-8")
+                    elif self._file.tell() > TRACE_FILE_MAX_MB * 1024 * 1024:
+                        self._file.close()
+                        os.replace(self.trace_file, self.trace_file + ".1")
+                        self._file = open(self.trace_file, "a", encoding="utf-8")
+                    self._file.write(line + "\n")
+                    self._file.flush()
+                except OSError as e:
+                    print(f"Disabling trace file {self.trace_file}: {e}")
+                    self.trace_file = None
+
+    def ingest(self, trace_id: Optional[str], rows: List[Dict[str, Any]], parent_id: Optional[int] = None,
+               record: bool = False) -> None:
+        """
+        Add spans finished in another process to a trace. Their top-level
+        spans become children of `parent_id`. By default they only go to
+        the debug panel, as the agent service already counted them in its
+        own metrics and trace file; record=True also counts and writes
+        them here (tool workers have no trace file of their own).
+        """
+        keys = {"trace_id", "span_id", "parent_id", "name", "kind", "start", "duration_ms"}
+        remotes = []
+        for row in rows:
+            remote = Span(str(row.get("name")), str(row.get("kind")), trace_id, row.get("parent_id") or parent_id,
+                          {k: v for k, v in row.items() if k not in keys})
+            remote.span_id = row.get("span_id") or remote.span_id
+            remote.start = row.get("start", remote.start)
+            remote.duration_ms = row.get("duration_ms")
+            remotes.append(remote)
+        if record:
+            for remote in remotes:
+                if remote.duration_ms is not None:
+                    self.record(remote)
+        elif trace_id:
+            with self._lock:
+                self._trace(trace_id).extend(remotes)
+
+    def take(self, trace_id: str) -> List[Span]:
+        """
+        Remove a trace and return its spans.
+        """
+        with self._lock:
+            return list(self._traces.pop(trace_id, ()))
+
+    def _trace(self, trace_id: str) -> Deque[Span]:
+        # Caller holds self._lock.
+        spans = self._traces.get(trace_id)
+        if spans is None:
+            spans = self._traces[trace_id] = deque(maxlen=MAX_SPANS_PER_TRACE)
+            while len(self._traces) > MAX_TRACES:
+                self._traces.popitem(last=False)
+        else:
+            self._traces.move_to_end(trace_id)
+        return spans
+
+    def spans(self, trace_id: str) -> List[Span]:
+        with self._lock:
+            return list(self._traces.get(trace_id, ()))
+
+    def prometheus_text(self) -> str:
+        """
+        Render span histograms and token counters in Prometheus text format.
+        """
+        lines = [
+            "# HELP chatbot_span_duration_ms Duration of traced operations.",
+            "# TYPE chatbot_span_duration_ms histogram",
+        ]
+        with self._lock:
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+            tokens = dict(self._tokens)
+        for (kind, name), values in sorted(histograms.items()):
+            labels = f'kind="{kind}",name="{name}"'
+            for bound, count in zip(DURATION_BUCKETS_MS, values):
+                lines.append(f'chatbot_span_duration_ms_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'chatbot_span_duration_ms_bucket{{{labels},le="+Inf"}} {values[-2]}')
+            lines.append(f"chatbot_span_duration_ms_sum{{{labels}}} {values[-1]:.3f}")
+            lines.append(f"chatbot_span_duration_ms_count{{{labels}}} {values[-2]}")
+        lines += ["# HELP chatbot_llm_tokens_total LLM tokens by model and direction.",
+                  "# TYPE chatbot_llm_tokens_total counter"]
+        for (model, direction), count in sorted(tokens.items()):
+            lines.append(f'chatbot_llm_tokens_total{{model="{model}",direction="{direction.split("_")[0]}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def record_remote_spans(rows: List[Dict[str, Any]]) -> None:
+    """
+    Record spans finished in a tool worker under the current span and trace.
+    """
+    parent = _current_span.get()
+    _tracer.ingest(_trace_id.get(), rows, parent.span_id if parent else None, record=True)
+
+
+@contextmanager
+def trace_session(trace_id: str):
+    """
+    Attribute every span started inside the block to `trace_id` (the browser session).
+    """
+    token = _trace_id.set(trace_id)
+    try:
+        yield
+    finally:
+        _trace_id.reset(token)
+
+
+@contextmanager
+def span(name: str, kind: str, **attributes: Any):
+    """
+    Time the block as a child of the current span and record it on exit.
+    Errors are recorded on the span and re-raised.
+    """
+    parent = _current_span.get()
+    current = Span(name, kind, _trace_id.get(), parent.span_id if parent else None, attributes)
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        current.duration_ms = (time.perf_counter() - start) * 1000
+        _current_span.reset(token)
+        _tracer.record(current)
+
+
+def record_span(name: str, kind: str, duration_ms: float, **attributes: Any) -> None:
+    """
+    Record an already-measured span under the current span.
+    """
+    parent = _current_span.get()
+    finished = Span(name, kind, _trace_id.get(), parent.span_id if parent else None, attributes)
+    finished.start -= duration_ms / 1000
+    finished.duration_ms = duration_ms
+    _tracer.record(finished)
+
+
+def traced_tool(func: Callable) -> Callable:
+    """
+    Wrap a tool function so each call is recorded as a tool_call span.
+    functools.wraps keeps the signature that ag2 turns into the tool schema.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(func.__name__, "tool_call"):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def instrument_agents(*agents) -> None:
+    """
+    Record an agent_turn span each time one of the agents sends a message,
+    timed from the previous message in the conversation.
+    """
+    state = {"last": time.perf_counter()}
+
+    def make_hook(agent):
+        def hook(sender, message, recipient, silent):
+            now = time.perf_counter()
+            content = message.get("content") if isinstance(message, dict) else message
+            record_span(agent.name, "agent_turn", (now - state["last"]) * 1000,
+                        recipient=getattr(recipient, "name", None),
+                        tool_calls=len(message.get("tool_calls") or []) if isinstance(message, dict) else 0,
+                        chars=len(content) if isinstance(content, str) else 0)
+            state["last"] = now
+            return message
+        return hook
+
+    for agent in agents:
+        agent.register_hook("process_message_before_send", make_hook(agent))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = _tracer.prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server: Optional[ThreadingHTTPServer] = None
+_metrics_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve /metrics in a daemon thread, once per process. Uses TRACE_METRICS_PORT
+    when no port is given; does nothing if neither is set.
+    """
+    global _metrics_server
+    port = port or (int(TRACE_METRICS_PORT) if TRACE_METRICS_PORT else None)
+    if port is None:
+        return None
+    with _metrics_lock:
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+            except OSError as e:
+                print(f"Could not start metrics server on port {port}: {e}")
+                return None
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True, name="trace-metrics").start()
+    return _metrics_server
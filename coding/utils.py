@@ -2,13 +2,69 @@ import streamlit as st
 from typing import List, Dict, Any, Optional
 import json
 import os
+import uuid
 from datetime import datetime
 
+from coding.scheduler import get_scheduler
+from coding.termination import strip_stop_signal
+from coding.tracing import get_tracer, start_metrics_server, trace_session, span
+
 def paging():
     st.page_link("streamlit_app.py", label="Home", icon="🏠")
     st.page_link("pages/one_agent.py", label="Teacher Agents' Talk", icon="👩‍💼")
     st.page_link("pages/two_agents.py", label="Two Agents' Talk", icon="💭")
 
+def session_tag() -> str:
+    """
+    A stable id for this browser session, used to tag its LLM requests.
+    """
+    return st.session_state.setdefault("session_tag", uuid.uuid4().hex)
+
+def queue_notice(placeholder):
+    """
+    Return an on_wait callback that tells the user when their LLM request
+    is waiting in the scheduler queue, and clears the notice otherwise.
+    """
+    tag = session_tag()
+
+    def update():
+        queued = get_scheduler().queued(tag)
+        if queued:
+            placeholder.info(f"⏳ Queued: {queued} request(s) waiting for model capacity...")
+        else:
+            placeholder.empty()
+
+    return update
+
+def run_traced(page_name: str, main_func):
+    """
+    Run a page's main() as one traced rerun of this browser session, and
+    start the Prometheus endpoint if TRACE_METRICS_PORT is set.
+    """
+    start_metrics_server()
+    with trace_session(session_tag()), span(page_name, "rerun"):
+        main_func()
+
+def show_trace_panel():
+    """
+    Sidebar debug panel with the time breakdown of this session's recent work.
+    """
+    spans = get_tracer().spans(session_tag())
+    with st.expander("🔍 Performance trace", expanded=False):
+        if not spans:
+            st.caption("No traced activity yet.")
+            return
+        rows = [s.to_dict() for s in spans if s.duration_ms is not None]
+        totals = {}
+        for row in rows:
+            total = totals.setdefault(row["kind"], {"kind": row["kind"], "count": 0, "total_ms": 0.0})
+            total["count"] += 1
+            total["total_ms"] += row["duration_ms"]
+        st.dataframe(sorted(totals.values(), key=lambda t: -t["total_ms"]), hide_index=True)
+        columns = ["kind", "name", "duration_ms", "model", "input_tokens", "output_tokens",
+                   "ttft_ms", "queue_wait_ms", "page", "error"]
+        st.dataframe([{c: row.get(c) for c in columns} for row in rows[-100:]][::-1], hide_index=True)
+
 def display_session_msg(container_obj, user_image: Optional[str] = None):
     # Initialize messages list if not present
     messages = st.session_state.setdefault("messages", [])
@@ -33,9 +89,9 @@ def display_session_msg(container_obj, user_image: Optional[str] = None):
 def show_chat_history(container_obj, chat_history: List[Dict[str, Any]], user_image=None) -> str:
     """
     Processes a list of chat history entries by:
-      1. Skipping any entries whose role is 'tool'
+      1. Skipping any entries whose role is 'tool' (chart images are shown)
       2. Skipping entries with null or empty content
-      3. Stripping out the "ALL DONE" token
+      3. Stripping out the "ALL DONE" stop markers
     Displays each valid message via Streamlit and returns the processed messages
     as a JSON-formatted string.
     """
@@ -46,6 +102,10 @@ def show_chat_history(container_obj, chat_history: List[Dict[str, Any]], user_im
 
     for entry in chat_history:
         if entry.get('role') == 'tool':
+            # Chart tools return the image path; show the image itself.
+            result = entry.get('content')
+            if isinstance(result, str) and result.endswith(".png") and os.path.exists(result):
+                container_obj.chat_message("ai").image(result)
             continue
 
         content = entry.get('content')
@@ -53,8 +113,7 @@ def show_chat_history(container_obj, chat_history: List[Dict[str, Any]], user_im
         if content is None:
             continue
         if isinstance(content, str):
-            content = content.replace("##ALL DONE##", "")
-            content = content.replace("ALL DONE", "")
+            content = strip_stop_signal(content)
             if not content.strip():
                 continue
         else:
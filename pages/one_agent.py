@@ -1,32 +1,24 @@
 import streamlit as st
+import base64
 import time
 import json
 from dotenv import load_dotenv
-import os
 
-from autogen import ConversableAgent, UserProxyAgent, LLMConfig
-from autogen.code_utils import content_str
+import pandas as pd
 
 # Utilities and tools (custom tool to be added soon)
-from coding.utils import show_chat_history, display_session_msg, save_messages_to_json, paging
-from coding.agenttools import extract_pdf_content, generate_wordcloud_from_pdf, update_market_data_and_show_preview
+from coding.utils import show_chat_history, display_session_msg, save_messages_to_json, paging, session_tag, queue_notice, run_traced, show_trace_panel
+from coding.router import get_intent_router, canned_response
+from coding.client import run_pipeline
 
 # Load environment variables
 load_dotenv(override=True)
 
 # Constants
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', None)
 placeholderstr = "Please input your command"
 user_name = "Team02"
 user_image = "https://www.w3schools.com/howto/img_avatar.png"
 
-# Gemini LLM config
-llm_config_gemini = LLMConfig(
-    api_type="google",
-    model="gemini-2.0-flash",
-    api_key=GEMINI_API_KEY,
-)
-
 def stream_data(stream_str):
     for word in stream_str.split(" "):
         yield word + " "
@@ -62,71 +54,59 @@ def main():
     st_c_chat = st.container(border=True)
     display_session_msg(st_c_chat, user_image)
 
-    # System instruction for the Gemini agent
-    system_instruction = f"""You are a helpful assistant. Use the registered tools to complete tasks. 
-    Always finish with '##ALL DONE##'. Respond in {lang_setting}.
-    """
-
-    # Instantiate the Gemini agent
-    with llm_config_gemini:
-        gemini_agent = ConversableAgent(
-            name="Gemini_Agent",
-            system_message=system_instruction,
-        )
-
-    # Set up user proxy
-    user_proxy = UserProxyAgent(
-        "user_proxy",
-        human_input_mode="NEVER",
-        code_execution_config=False,
-        is_termination_msg=lambda x: content_str(x.get("content")).find("##ALL DONE##") >= 0,
-    )
-
-    # Register tools
-    def register_agent_methods(agent, proxy, methods):
-        for name, description, func in methods:
-            agent.register_for_llm(name=name, description=description)(func)
-            proxy.register_for_execution(name=name)(func)
-
-    methods_to_register = [
-        ("extract_pdf_content", "Extracts text (and tables) from a hardcoded PDF file.", extract_pdf_content),
-        ("generate_wordcloud_from_pdf", "Generate a word cloud from the entire PDF.", generate_wordcloud_from_pdf),
-        ("fetch_market_data", "Fetch Market data from Yahoo Finance", update_market_data_and_show_preview)
-    ]
-
-    register_agent_methods(gemini_agent, user_proxy, methods_to_register)
-
     def generate_response(prompt):
-        chat_result = user_proxy.initiate_chat(
-            gemini_agent,
-            message=prompt,
-        )
-        return chat_result.chat_history
+        notice = st.empty()
+        result = run_pipeline("tools", prompt, lang_setting, user_name, session_tag(), on_wait=queue_notice(notice))
+        notice.empty()
+        return result["messages"]
 
     def chat(prompt: str):
-
-        if "summary" in prompt.lower() or "summarize" in prompt.lower():
-            from coding.agenttools import extract_pdf_content
-            content = extract_pdf_content()
+        intent = get_intent_router().route(prompt)
+
+        if intent.label == "PDF_SUMMARY":
+            try:
+                with st.spinner("Summarizing the PDF..."):
+                    result = run_pipeline("pdf_summary", prompt, lang_setting, user_name, session_tag())
+            except RuntimeError as e:
+                st.warning(f"Could not summarize the PDF: {e}")
+                return
             st.write("### PDF Content Summary:")
-            for i, page in enumerate(content, 1):
-                st.write(f"**Page {i}**: {page[:500]}")  # Display first 500 characters of each page
+            st.write(result["summary"])
+            st.caption(f"{result['chunks']} chunks ({result['cached']} summaries cached), "
+                       f"{result['llm_calls']} LLM calls in {result['rounds']} rounds")
+            return
+
+        elif intent.label == "WORDCLOUD":
+            try:
+                with st.spinner("Drawing the word cloud..."):
+                    result = run_pipeline("wordcloud", prompt, lang_setting, user_name, session_tag())
+            except RuntimeError as e:
+                st.warning(f"Could not draw the word cloud: {e}")
+                return
+            st.image(base64.b64decode(result["image"]), caption="Word Cloud from PDF")
             return
 
-        elif "wordcloud" in prompt.lower():
-            from coding.agenttools import generate_wordcloud_from_pdf
-            image_path = generate_wordcloud_from_pdf()
-            st.image(image_path, caption="Word Cloud from PDF")
+        elif intent.label == "MARKET_DATA":
+            try:
+                with st.spinner("Drawing the market chart..."):
+                    result = run_pipeline("market_chart", prompt, lang_setting, user_name, session_tag())
+            except (RuntimeError, ValueError) as e:
+                st.warning(f"Could not chart the market data: {e}")
+                return
+            if "error" in result:
+                st.warning(result["error"])
+                return
+            st.write("### Market Data:")
+            st.image(base64.b64decode(result["image"]))
+            st.dataframe(pd.DataFrame(result["table"]))
             return
 
-        elif "market" in prompt.lower() or "market data" in prompt.lower():
-            from coding.agenttools import fetch_market_data  # Assuming it's in same file or imported
-            df = fetch_market_data()
-            if df is not None:
-                st.write("### Market Data Preview:")
-                st.dataframe(df.head())
-            else:
-                st.warning("No market data retrieved.")
+        canned = canned_response(intent, lang_setting)
+        if canned:
+            st_c_chat.chat_message("user", avatar=user_image).write(prompt)
+            st_c_chat.chat_message("assistant").write(canned)
+            st.session_state.messages.append({"role": "user", "content": prompt})
+            st.session_state.messages.append({"role": "assistant", "content": canned})
             return
 
         response = generate_response(prompt)
@@ -135,5 +115,8 @@ def main():
     if prompt := st.chat_input(placeholder=placeholderstr, key="chat_bot"):
         chat(prompt)
 
+    with st.sidebar:
+        show_trace_panel()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_traced("one_agent", main)
\ No newline at end of file
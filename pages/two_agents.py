@@ -5,41 +5,18 @@ import json
 from dotenv import load_dotenv
 import os
 
-# Import ConversableAgent class
-import autogen
-from autogen import ConversableAgent, LLMConfig, Agent
-from autogen import AssistantAgent, UserProxyAgent, LLMConfig, register_function
-from autogen.code_utils import content_str
-from coding.constant import JOB_DEFINITION, RESPONSE_FORMAT
-from coding.utils import show_chat_history, display_session_msg, save_messages_to_json, paging
-from coding.agenttools import AG_search_expert, AG_search_news, AG_search_textbook, get_time
+from coding.utils import show_chat_history, display_session_msg, save_messages_to_json, paging, session_tag, queue_notice, run_traced, show_trace_panel
+from coding.client import run_pipeline
 
 # Load environment variables from .env file
 load_dotenv(override=True)
 
-# https://ai.google.dev/gemini-api/docs/pricing
-# URL configurations
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', None)
-OPEN_API_KEY = os.getenv('OPEN_API_KEY', None)
-
 placeholderstr = "Please input your command"
 user_name = "Team02"
 user_image = "https://www.w3schools.com/howto/img_avatar.png"
 
 seed = 42
 
-llm_config_gemini = LLMConfig(
-    api_type = "google", 
-    model="gemini-2.0-flash", # The specific model
-    api_key=GEMINI_API_KEY,   # Authentication
-)
-
-llm_config_openai = LLMConfig(
-    api_type = "openai", 
-    model="gpt-4o-mini",    # The specific model
-    api_key=OPEN_API_KEY,   # Authentication
-)
-
 def stream_data(stream_str):
     for word in stream_str.split(" "):
         yield word + " "
@@ -82,85 +59,12 @@ def main():
     
     display_session_msg(st_c_chat, user_image)
 
-    student_persona = f"""You are a student willing to learn. After your result, say 'ALL DONE'. Please output in {lang_setting}"""
-
-    teacher_persona = f"""You are a teacher. Please try to use tools to answer student's question according to the following rules:
-    1. Check current time: use `get_time` tool to retrieve current date and time.
-    2. Search news by `AG_search_news` according to user's question, try to distill student's question within 1~2 words and facilitate it as query string. Also you may search by sections,  e.g. ['Taiwan News', 'World News', 'Sports', 'Front Page', 'Features', 'Editorials', 'Business','Bilingual Pages'], if you cannot distill it, use None instead. 
-    3. From the return news, randomly pick one news. Classify the news to the following <DISCIPLINE>:
-    <DISCIPLINE>
-        "Digital Sociology"
-        "Information Systems Strategy"
-        "Technology and Society"
-        "Empathetic and research-driven"
-        "Computational Social Science"
-    </DISCIPLINE>
-    4. Use `AG_search_expert` to select expert by <DISCIPLINE>, also Use `AG_search_textbook` to select a textbook by <DISCIPLINE>.
-    5. Explain to student a interesting essay within 500 words about the news using expert and textbook. Please remember to mention about the expert and textbook you cite.
-
-    6. Please output in {lang_setting}
-
-    """
-    with llm_config_openai:
-    # with llm_config_gemini:
-        student_agent = ConversableAgent(
-            name="Student_Agent",
-            system_message=student_persona,
-        )
-
-        teacher_agent = ConversableAgent(
-            name="Teacher_Agent",
-            system_message=teacher_persona,
-            is_termination_msg=lambda x: content_str(x.get("content")).find("ALL_DONE") >= 0,
-            human_input_mode="NEVER",
-        )
-
-    user_proxy = UserProxyAgent(
-        "user_proxy",
-        human_input_mode="NEVER",
-        code_execution_config=False,
-        is_termination_msg=lambda x: content_str(x.get("content")).find("ALL DONE") >= 0,
-    )
-
-    register_function(
-        AG_search_expert,
-        caller=teacher_agent,
-        executor=student_agent,
-        description="Search EXPERTS_LIST by name, discipline, or interest.",
-    )
-
-    register_function(
-        AG_search_textbook,
-        caller=teacher_agent,
-        executor=student_agent,
-        description="Search TEXTBOOK_LIST by title, discipline, or related_expert.",
-    )
-
-
-
-    register_function(
-        AG_search_news,
-        caller=teacher_agent,
-        executor=student_agent,
-        description="Search a pre-fetched news DataFrame by keywords, sections, and date range.",
-    )
-
-    register_function(
-        get_time,
-        caller=teacher_agent,
-        executor=student_agent,
-        description="Get the current date & time.",
-    )
-
     def generate_response(prompt):
-        chat_result = student_agent.initiate_chat(
-            teacher_agent,
-            message = prompt,
-            summary_method="reflection_with_llm",
-            max_turns=10,
-        )
-
-        response = chat_result.chat_history
+        notice = st.empty()
+        result = run_pipeline("teacher", prompt, lang_setting, user_name, session_tag(), on_wait=queue_notice(notice))
+        notice.empty()
+
+        response = result["messages"]
         # st.write(response)
         return response
 
@@ -174,5 +78,8 @@ def main():
     if prompt := st.chat_input(placeholder=placeholderstr, key="chat_bot"):
         chat(prompt)
 
+    with st.sidebar:
+        show_trace_panel()
+
 if __name__ == "__main__":
-    main()
+    run_traced("two_agents", main)
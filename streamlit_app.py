@@ -1,63 +1,20 @@
-from openai import OpenAI
 import time
-import re
 from dotenv import load_dotenv
-import os
 
-# Import ConversableAgent class
-import autogen
-from autogen import ConversableAgent, LLMConfig
-from autogen import AssistantAgent, UserProxyAgent, LLMConfig
-from autogen.code_utils import content_str
-from coding.constant import JOB_DEFINITION, RESPONSE_FORMAT
-from coding.utils import paging
+from coding.utils import paging, session_tag, queue_notice, run_traced, show_trace_panel
+from coding.client import run_pipeline
 
 import streamlit as st
 
 # Load environment variables from .env file
 load_dotenv(override=True)
 
-# https://ai.google.dev/gemini-api/docs/pricing
-# URL configurations
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', None)
-OPEN_API_KEY = os.getenv('OPEN_API_KEY', None)
-
 placeholderstr = "Please input your command"
 user_name = "Team02"
 user_image = "https://www.w3schools.com/howto/img_avatar.png"
 
 seed = 42
 
-llm_config_gemini = LLMConfig(
-    api_type = "google", 
-    model="gemini-2.0-flash-lite",                    # The specific model
-    api_key=GEMINI_API_KEY,   # Authentication
-)
-
-llm_config_openai = LLMConfig(
-    api_type = "openai", 
-    model="gpt-4o-mini",                    # The specific model
-    api_key=OPEN_API_KEY,   # Authentication
-)
-
-with llm_config_gemini:
-    assistant = AssistantAgent(
-        name="assistant",
-        system_message=(
-        "You are a helpful storyteller assistant. "
-        "Please give me a story. After your result, say 'ALL DONE'. "
-        "Do not say 'ALL DONE' in the same response."
-        ),
-        max_consecutive_auto_reply=2
-    )
-
-user_proxy = UserProxyAgent(
-    "user_proxy",
-    human_input_mode="NEVER",
-    code_execution_config=False,
-    is_termination_msg=lambda x: content_str(x.get("content")).find("ALL DONE") >= 0,
-)
-
 # Function Declaration 
 
 def stream_data(stream_str):
@@ -119,32 +76,12 @@ def main():
                     st_c_chat.chat_message(msg["role"]).markdown((msg["content"]))
 
 
-    story_template = ("Give me a story started from '##PROMPT##'."
-                      f"And remeber to mention user's name {user_name} in the end. Add some emoji in the end of each sentence."
-                      f"Please express in {lang_setting}")
-
-    classification_template = ("You are a classification agent, your job is to classify what ##PROMPT## is according to the job definition list in <JOB_DEFINITION>"
-    "<JOB_DEFINITION>"
-    f"{JOB_DEFINITION}"
-    "</JOB_DEFINITION>"
-    "Please output in JSON-format only."
-    "JSON-format is as below:"
-    f"{RESPONSE_FORMAT}"
-    "Let's think step by step."
-    f"Please output in {lang_setting}"
-    )
-
     def generate_response(prompt):
+        notice = st.empty()
+        result = run_pipeline("story", prompt, lang_setting, user_name, session_tag(), on_wait=queue_notice(notice))
+        notice.empty()
 
-        # prompt_template = f"Give me a story started from '{prompt}'"
-        prompt_template = story_template.replace('##PROMPT##',prompt)
-        # prompt_template = classification_template.replace('##PROMPT##',prompt)
-        result = user_proxy.initiate_chat(
-        recipient=assistant,
-        message=prompt_template
-        )
-
-        response = result.summary
+        response = result["reply"]
         return response
 
 
@@ -162,5 +99,8 @@ def main():
     if prompt := st.chat_input(placeholder=placeholderstr, key="chat_bot"):
         chat(prompt)
 
+    with st.sidebar:
+        show_trace_panel()
+
 if __name__ == "__main__":
-    main()
+    run_traced("streamlit_app", main)